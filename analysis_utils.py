@@ -13,6 +13,8 @@ from typing import List, Dict, Optional, Tuple
 from collections import Counter
 import string
 
+from cache_utils import cached_by_content
+
 logger = logging.getLogger(__name__)
 
 # Pre-defined categories for document classification
@@ -66,46 +68,216 @@ SEVERITY_KEYWORDS = {
     "Low Priority": ["low priority", "optional", "fyi", "for your information", "non-urgent"]
 }
 
+# Common stop words (English and some Indonesian)
+STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'been',
+    'be', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those',
+    'i', 'you', 'he', 'she', 'it', 'we', 'they', 'what', 'which', 'who',
+    'when', 'where', 'why', 'how', 'all', 'each', 'every', 'both', 'few',
+    'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only',
+    'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'just', 'don',
+    'now', 'yang', 'dan', 'di', 'ke', 'dari', 'untuk', 'dengan', 'pada',
+    'adalah', 'ini', 'itu', 'akan', 'telah', 'dapat', 'juga', 'ada'
+})
+
+# Precompiled patterns used by the analysis functions
+_WORD_RE = re.compile(r'\b[a-z]{3,}\b')
+_HEADING_RE = re.compile(r'^#+\s*')
+_TITLE_PREFIXES = ('title:', 'subject:', 're:', 'topic:', 'document:')
+_TITLE_PREFIX_MAX = max(len(p) for p in _TITLE_PREFIXES)
+_CLEAN_RE = re.compile(r'[^\w\s\-,.:()]')
+_SENT_SPLIT_RE = re.compile(r'[.!?]\s+')
+_SENT_RE = re.compile(r'[.!?]+(?:\s*[.!?]+)*')
+_BLANK_RE = re.compile(r'\s*')
+_PARA_RE = re.compile(r'\n\s*\n')
+_SPACE_RE = re.compile(r'\s')
+
+# Window size used when counting words, bounding the temporary word list
+_WORD_COUNT_WINDOW = 1 << 16
+
+
+def _build_keyword_vocab(*keyword_tables: Dict[str, List[str]]) -> Tuple[Tuple[str, bytes], ...]:
+    """
+    Collect the distinct keywords of the given tables, in first-seen order,
+    paired with the UTF-8 encoding of their lowercased form.
+    
+    Keywords keep their original case, which is what the results report in
+    'matches'; only the encoded form is matched against lowercased text.
+    """
+    vocab = {}
+    for table in keyword_tables:
+        for keywords in table.values():
+            for keyword in keywords:
+                vocab.setdefault(keyword, keyword.lower().encode('utf-8'))
+    return tuple(vocab.items())
+
+
+# Distinct keywords per scoring table; shared keywords (e.g. "contract",
+# "agreement", "invoice") are only scanned for once per call.
+_CATEGORY_VOCAB = _build_keyword_vocab(CATEGORY_KEYWORDS)
+_SEVERITY_VOCAB = _build_keyword_vocab(SEVERITY_KEYWORDS)
+_ANALYSIS_VOCAB = _build_keyword_vocab(CATEGORY_KEYWORDS, SEVERITY_KEYWORDS)
+
+
+# Result cache for the analysis functions, keyed on a digest of the text so
+# cached entries never hold on to whole documents.
+ANALYSIS_CACHE_SIZE = 512
+ANALYSIS_CACHE_MAX_TEXT_LENGTH = 1_000_000
 
-def extract_keywords(text: str, max_keywords: int = 10) -> List[str]:
+_cached_by_content = cached_by_content(
+    maxsize=ANALYSIS_CACHE_SIZE,
+    max_text_length=ANALYSIS_CACHE_MAX_TEXT_LENGTH,
+    # A precomputed text_lower only saves work and is derived from the text
+    ignore_kwargs=('text_lower',)
+)
+
+
+def _count_keywords(text_lower: str, vocab: Tuple[Tuple[str, bytes], ...]) -> Dict[str, int]:
+    """
+    Count occurrences of every keyword in vocab within the lowercased text.
+    
+    The text is encoded to UTF-8 once and scanned as bytes, which keeps the
+    scans on the byte-search fast path even when the document contains
+    non-ASCII characters.
+    """
+    text_bytes = text_lower.encode('utf-8', 'surrogatepass')
+    return {keyword: text_bytes.count(keyword_bytes) for keyword, keyword_bytes in vocab}
+
+
+def _count_words(text: str) -> int:
+    """
+    Count whitespace-separated words, exactly as len(text.split()) would.
+    
+    The text is split in windows of about _WORD_COUNT_WINDOW characters, each
+    extended to the next whitespace so no word is cut in two, which keeps the
+    temporary word list small for large documents.
+    """
+    count = 0
+    start = 0
+    length = len(text)
+    while start < length:
+        end = start + _WORD_COUNT_WINDOW
+        if end < length:
+            match = _SPACE_RE.search(text, end)
+            end = match.start() if match else length
+        count += len(text[start:end].split())
+        start = end
+    return count
+
+
+def _extract_keywords(text_lower: str, max_keywords: int) -> List[str]:
+    """Return the most frequent non-stop-word terms of the lowercased text."""
+    # Extract words (alphanumeric only), filter stop words and count frequency
+    word_freq = Counter(w for w in _WORD_RE.findall(text_lower) if w not in STOP_WORDS)
+    
+    # Get top keywords
+    return [word for word, _ in word_freq.most_common(max_keywords)]
+
+
+def _score_categories(
+    keyword_counts: Dict[str, int],
+    text_length: int,
+    max_categories: int,
+    threshold: float
+) -> List[Dict[str, any]]:
+    """Rank categories from precomputed keyword counts."""
+    category_scores = {}
+    
+    # Calculate score for each category, normalized by text length (per 1000 chars)
+    if text_length > 0:
+        for category, keywords in CATEGORY_KEYWORDS.items():
+            counts = [(keyword, keyword_counts[keyword]) for keyword in keywords]
+            score = sum(count for _, count in counts)
+            matches = [keyword for keyword, count in counts if count > 0]
+            category_scores[category] = {
+                'score': (score / text_length) * 1000,
+                'matches': matches[:5]  # Keep top 5 matches
+            }
+    
+    # Sort by score and filter by threshold
+    sorted_categories = sorted(
+        category_scores.items(),
+        key=lambda x: x[1]['score'],
+        reverse=True
+    )
+    
+    # Get top categories above threshold
+    results = []
+    for category, data in sorted_categories[:max_categories]:
+        if data['score'] >= threshold:
+            results.append({
+                'category': category,
+                'confidence': min(data['score'] / 10, 1.0),  # Cap at 1.0
+                'matches': data['matches']
+            })
+    
+    # If no categories meet threshold, return "Other"
+    if not results:
+        results.append({
+            'category': 'Other',
+            'confidence': 0.5,
+            'matches': []
+        })
+    
+    return results
+
+
+def _score_severity(keyword_counts: Dict[str, int]) -> Dict[str, any]:
+    """Pick the severity level from precomputed keyword counts."""
+    severity_scores = {}
+    
+    # Calculate score for each severity level
+    for severity, keywords in SEVERITY_KEYWORDS.items():
+        counts = [(keyword, keyword_counts[keyword]) for keyword in keywords]
+        score = sum(count for _, count in counts)
+        matches = [keyword for keyword, count in counts if count > 0]
+        
+        severity_scores[severity] = {
+            'score': score,
+            'matches': matches
+        }
+    
+    # Find highest scoring severity
+    max_severity = max(severity_scores.items(), key=lambda x: x[1]['score'])
+    
+    # If no keywords found, default to Normal
+    if max_severity[1]['score'] == 0:
+        return {
+            'severity': 'Normal',
+            'confidence': 0.5,
+            'matches': []
+        }
+    
+    # Calculate confidence based on score
+    total_score = sum(s['score'] for s in severity_scores.values())
+    confidence = max_severity[1]['score'] / total_score if total_score > 0 else 0.5
+    
+    return {
+        'severity': max_severity[0],
+        'confidence': min(confidence, 1.0),
+        'matches': max_severity[1]['matches'][:3]
+    }
+
+
+@_cached_by_content
+def extract_keywords(text: str, max_keywords: int = 10, *, text_lower: Optional[str] = None) -> List[str]:
     """
     Extract important keywords from text using frequency analysis.
     
     Args:
         text: Input text content
         max_keywords: Maximum number of keywords to extract
+        text_lower: Precomputed text.lower(), if the caller already has it
         
     Returns:
         List of extracted keywords
     """
     try:
-        # Convert to lowercase and remove special characters
-        text = text.lower()
-        
-        # Common stop words (English and some Indonesian)
-        stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'been',
-            'be', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
-            'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those',
-            'i', 'you', 'he', 'she', 'it', 'we', 'they', 'what', 'which', 'who',
-            'when', 'where', 'why', 'how', 'all', 'each', 'every', 'both', 'few',
-            'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only',
-            'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'just', 'don',
-            'now', 'yang', 'dan', 'di', 'ke', 'dari', 'untuk', 'dengan', 'pada',
-            'adalah', 'ini', 'itu', 'akan', 'telah', 'dapat', 'juga', 'ada'
-        }
-        
-        # Extract words (alphanumeric only)
-        words = re.findall(r'\b[a-z]{3,}\b', text)
-        
-        # Filter stop words and count frequency
-        filtered_words = [w for w in words if w not in stop_words]
-        word_freq = Counter(filtered_words)
-        
-        # Get top keywords
-        keywords = [word for word, _ in word_freq.most_common(max_keywords)]
-        
+        if text_lower is None:
+            text_lower = text.lower()
+        keywords = _extract_keywords(text_lower, max_keywords)
         logger.info(f"Extracted {len(keywords)} keywords from text")
         return keywords
         
@@ -114,7 +286,14 @@ def extract_keywords(text: str, max_keywords: int = 10) -> List[str]:
         return []
 
 
-def predict_categories(text: str, max_categories: int = 3, threshold: float = 0.1) -> List[Dict[str, any]]:
+@_cached_by_content
+def predict_categories(
+    text: str,
+    max_categories: int = 3,
+    threshold: float = 0.1,
+    *,
+    text_lower: Optional[str] = None
+) -> List[Dict[str, any]]:
     """
     Predict document categories using keyword matching.
     
@@ -122,60 +301,16 @@ def predict_categories(text: str, max_categories: int = 3, threshold: float = 0.
         text: Input text content
         max_categories: Maximum number of categories to return
         threshold: Minimum score threshold (0-1)
+        text_lower: Precomputed text.lower(), if the caller already has it
         
     Returns:
         List of category predictions with scores
     """
     try:
-        text_lower = text.lower()
-        category_scores = {}
-        
-        # Calculate score for each category
-        for category, keywords in CATEGORY_KEYWORDS.items():
-            score = 0
-            matches = []
-            
-            for keyword in keywords:
-                # Count occurrences of keyword
-                count = text_lower.count(keyword.lower())
-                if count > 0:
-                    score += count
-                    matches.append(keyword)
-            
-            # Normalize score by text length (per 1000 chars)
-            text_length = len(text)
-            if text_length > 0:
-                normalized_score = (score / text_length) * 1000
-                category_scores[category] = {
-                    'score': normalized_score,
-                    'matches': matches[:5]  # Keep top 5 matches
-                }
-        
-        # Sort by score and filter by threshold
-        sorted_categories = sorted(
-            category_scores.items(),
-            key=lambda x: x[1]['score'],
-            reverse=True
-        )
-        
-        # Get top categories above threshold
-        results = []
-        for category, data in sorted_categories[:max_categories]:
-            if data['score'] >= threshold:
-                results.append({
-                    'category': category,
-                    'confidence': min(data['score'] / 10, 1.0),  # Cap at 1.0
-                    'matches': data['matches']
-                })
-        
-        # If no categories meet threshold, return "Other"
-        if not results:
-            results.append({
-                'category': 'Other',
-                'confidence': 0.5,
-                'matches': []
-            })
-        
+        if text_lower is None:
+            text_lower = text.lower()
+        keyword_counts = _count_keywords(text_lower, _CATEGORY_VOCAB)
+        results = _score_categories(keyword_counts, len(text), max_categories, threshold)
         logger.info(f"Predicted {len(results)} categories")
         return results
         
@@ -184,62 +319,30 @@ def predict_categories(text: str, max_categories: int = 3, threshold: float = 0.
         return [{'category': 'Other', 'confidence': 0.5, 'matches': []}]
 
 
-def predict_severity(text: str) -> Dict[str, any]:
+@_cached_by_content
+def predict_severity(text: str, *, text_lower: Optional[str] = None) -> Dict[str, any]:
     """
     Predict document severity/importance level.
     
     Args:
         text: Input text content
+        text_lower: Precomputed text.lower(), if the caller already has it
         
     Returns:
         Dictionary with severity level and confidence
     """
     try:
-        text_lower = text.lower()
-        severity_scores = {}
-        
-        # Calculate score for each severity level
-        for severity, keywords in SEVERITY_KEYWORDS.items():
-            score = 0
-            matches = []
-            
-            for keyword in keywords:
-                count = text_lower.count(keyword.lower())
-                if count > 0:
-                    score += count
-                    matches.append(keyword)
-            
-            severity_scores[severity] = {
-                'score': score,
-                'matches': matches
-            }
-        
-        # Find highest scoring severity
-        max_severity = max(severity_scores.items(), key=lambda x: x[1]['score'])
-        
-        # If no keywords found, default to Normal
-        if max_severity[1]['score'] == 0:
-            return {
-                'severity': 'Normal',
-                'confidence': 0.5,
-                'matches': []
-            }
-        
-        # Calculate confidence based on score
-        total_score = sum(s['score'] for s in severity_scores.values())
-        confidence = max_severity[1]['score'] / total_score if total_score > 0 else 0.5
-        
-        return {
-            'severity': max_severity[0],
-            'confidence': min(confidence, 1.0),
-            'matches': max_severity[1]['matches'][:3]
-        }
+        if text_lower is None:
+            text_lower = text.lower()
+        keyword_counts = _count_keywords(text_lower, _SEVERITY_VOCAB)
+        return _score_severity(keyword_counts)
         
     except Exception as e:
         logger.error(f"Error predicting severity: {str(e)}")
         return {'severity': 'Normal', 'confidence': 0.5, 'matches': []}
 
 
+@_cached_by_content
 def predict_title_simple(text: str, max_length: int = 100) -> Optional[str]:
     """
     Predict document title using simple heuristics.
@@ -260,31 +363,33 @@ def predict_title_simple(text: str, max_length: int = 100) -> Optional[str]:
             line = line.strip()
             if line.startswith('#'):
                 # Extract heading text
-                title = re.sub(r'^#+\s*', '', line).strip()
+                title = _HEADING_RE.sub('', line).strip()
                 if title and len(title) <= max_length:
                     return title
         
         # Strategy 2: Look for patterns like "Title:", "Subject:", etc.
         for line in lines[:10]:
             line = line.strip()
-            match = re.match(r'^(title|subject|re|topic|document):\s*(.+)$', line, re.IGNORECASE)
-            if match:
-                title = match.group(2).strip()
-                if title and len(title) <= max_length:
-                    return title
+            head = line[:_TITLE_PREFIX_MAX].lower()
+            for prefix in _TITLE_PREFIXES:
+                if head.startswith(prefix):
+                    title = line[len(prefix):].strip()
+                    if title and len(title) <= max_length:
+                        return title
+                    break
         
         # Strategy 3: Use first non-empty line
         for line in lines[:5]:
             line = line.strip()
             if line and len(line) <= max_length:
                 # Clean up
-                title = re.sub(r'[^\w\s\-,.:()]', '', line)
+                title = _CLEAN_RE.sub('', line)
                 if len(title) > 10:  # Minimum meaningful length
                     return title[:max_length]
         
         # Strategy 4: Extract from first sentence
         first_text = ' '.join(lines[:3])
-        sentences = re.split(r'[.!?]\s+', first_text)
+        sentences = _SENT_SPLIT_RE.split(first_text)
         if sentences:
             title = sentences[0].strip()
             if len(title) > 10 and len(title) <= max_length:
@@ -298,6 +403,7 @@ def predict_title_simple(text: str, max_length: int = 100) -> Optional[str]:
         return None
 
 
+@_cached_by_content
 def extract_text_statistics(text: str) -> Dict[str, any]:
     """
     Extract basic statistics about the text.
@@ -311,16 +417,30 @@ def extract_text_statistics(text: str) -> Dict[str, any]:
     try:
         # Basic counts
         char_count = len(text)
-        word_count = len(text.split())
-        line_count = len(text.split('\n'))
-        
-        # Sentence count (approximate)
-        sentences = re.split(r'[.!?]+', text)
-        sentence_count = len([s for s in sentences if s.strip()])
-        
-        # Paragraph count (approximate - blank line separated)
-        paragraphs = re.split(r'\n\s*\n', text)
-        paragraph_count = len([p for p in paragraphs if p.strip()])
+        word_count = _count_words(text)
+        line_count = text.count('\n') + 1
+        
+        # Sentence count (approximate - terminator-separated), counted from
+        # the terminator runs without materializing the sentences
+        sentence_count = 0
+        last_end = 0
+        for match in _SENT_RE.finditer(text):
+            if sentence_count or not _BLANK_RE.fullmatch(text, 0, match.start()):
+                sentence_count += 1
+            last_end = match.end()
+        if not _BLANK_RE.fullmatch(text, last_end):
+            sentence_count += 1
+        
+        # Paragraph count (approximate - blank line separated), counted the
+        # same way from the separators
+        paragraph_count = 0
+        last_end = 0
+        for match in _PARA_RE.finditer(text):
+            if paragraph_count or not _BLANK_RE.fullmatch(text, 0, match.start()):
+                paragraph_count += 1
+            last_end = match.end()
+        if not _BLANK_RE.fullmatch(text, last_end):
+            paragraph_count += 1
         
         return {
             'characters': char_count,
@@ -336,6 +456,60 @@ def extract_text_statistics(text: str) -> Dict[str, any]:
         return {}
 
 
+@_cached_by_content
+def analyze_document(text: str, max_keywords: int = 10, max_categories: int = 3) -> Dict[str, any]:
+    """
+    Run all lightweight analyses over the text in a single fused pass.
+    
+    The text is lowercased once and every category and severity keyword is
+    counted once; keywords, categories and severity are all derived from
+    that shared work.
+    
+    Args:
+        text: Input text content
+        max_keywords: Maximum number of keywords to extract
+        max_categories: Maximum number of categories to return
+        
+    Returns:
+        Dictionary with keywords, categories, severity, title and statistics
+    """
+    text_lower = None
+    try:
+        text_lower = text.lower()
+        keyword_counts = _count_keywords(text_lower, _ANALYSIS_VOCAB)
+        result = {
+            'keywords': _extract_keywords(text_lower, max_keywords),
+            'categories': _score_categories(keyword_counts, len(text), max_categories, 0.1),
+            'severity': _score_severity(keyword_counts),
+        }
+    except Exception as e:
+        logger.error(f"Error analyzing document: {str(e)}")
+        result = {
+            'keywords': extract_keywords(text, max_keywords, text_lower=text_lower),
+            'categories': predict_categories(text, max_categories, text_lower=text_lower),
+            'severity': predict_severity(text, text_lower=text_lower),
+        }
+    
+    # This function's own cache already covers the whole result, so the
+    # uncached implementations are called rather than hashing the text again
+    # for the title and statistics caches
+    result['title'] = predict_title_simple.__wrapped__(text)
+    result['statistics'] = extract_text_statistics.__wrapped__(text)
+    
+    logger.info(
+        f"Analyzed document: {len(result['keywords'])} keywords, "
+        f"{len(result['categories'])} categories, severity {result['severity']['severity']}"
+    )
+    return result
+
+
+def clear_analysis_cache():
+    """Drop cached analysis results, e.g. between benchmark or test runs."""
+    for func in (extract_keywords, predict_categories, predict_severity,
+                 predict_title_simple, extract_text_statistics, analyze_document):
+        func.cache_clear()
+
+
 # Test function
 if __name__ == "__main__":
     # Test with sample text
@@ -1,30 +1,43 @@
 """Main Flask application for markitdown API."""
 import os
+import secrets
+import time
 from datetime import datetime
-from urllib.parse import urlparse
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session as flask_session
+import mimetypes
+from urllib.parse import urlparse, quote
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, abort, session as flask_session
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
-from markitdown import MarkItDown
-from models import init_db, get_session, init_default_user, init_default_config, User, Conversion, AppConfig
-from ocr_utils import convert_pdf_with_ocr_fallback, extract_text_from_image
-from llm_utils import process_document, initialize_llm, get_model_info, generate_title
-from analysis_utils import (
-    extract_keywords, 
-    predict_categories, 
-    predict_severity, 
-    predict_title_simple,
-    extract_text_statistics
+from werkzeug.security import safe_join
+from sqlalchemy.orm import load_only, undefer_group
+from models import (
+    init_db, get_scoped_session, init_default_user, init_default_config, User, Conversion,
+    ConversionJob, JOB_QUEUED, JOB_RUNNING, JOB_FINISHED, JOB_FAILED
 )
+from db_utils import ConversionWriter, ConfigCache
+from conversion_utils import convert_file, get_markitdown, init_conversion_process, IMAGE_EXTENSIONS
+from json_utils import OrjsonProvider
+from llm_utils import process_document, process_document_combined, get_model_info, generate_title
+from analysis_utils import analyze_document
 import threading
-import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 import logging
-import json
+import orjson
+import hashlib
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Internal nginx location aliased to the upload folder (e.g. /internal-uploads/).
+# When set, uploads are served by nginx via X-Accel-Redirect instead of Python
+app.config['UPLOADS_ACCEL_REDIRECT'] = os.environ.get('UPLOADS_ACCEL_REDIRECT')
+# Behind Apache (mod_xsendfile) or lighttpd, send_from_directory can instead
+# emit an X-Sendfile header and let the server send the file
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -35,17 +48,94 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # Initialize database
 engine = init_db()
-db_session = get_session(engine)
+db_session = get_scoped_session(engine)
 init_default_user(db_session)
 init_default_config(db_session)
+db_session.remove()
+
+# Conversion rows are inserted by a background writer so that concurrent
+# uploads share commits
+conversion_writer = ConversionWriter(engine)
+
+# Settings are served from an in-process cache instead of per-request queries
+config_cache = ConfigCache(engine)
+config_cache.reload()
 
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# Initialize MarkItDown
-md = MarkItDown()
+# Document conversion runs in a pool of worker processes so CPU-bound
+# converters (MarkItDown, OCR) can use every core
+CONVERSION_WORKERS = int(os.environ.get('CONVERSION_WORKERS', os.cpu_count() or 1))
+# Pool workers are started from a clean server process rather than forked
+# from this one, so they don't inherit its threads, database connections
+# or loaded model
+_conversion_mp_context = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+_conversion_pool = None
+_conversion_pool_pid = None
+_conversion_pool_lock = threading.Lock()
+
+
+def get_conversion_pool():
+    """Return this process's conversion pool, creating it on first use."""
+    global _conversion_pool, _conversion_pool_pid
+    with _conversion_pool_lock:
+        # A pool inherited through fork() is unusable, so each worker
+        # process creates its own
+        if _conversion_pool is None or _conversion_pool_pid != os.getpid():
+            # One OCR'd page per pool process at a time overall, however the
+            # pages are spread over conversions; a new semaphore per pool so
+            # slots held by terminated workers are not lost
+            ocr_slots = _conversion_mp_context.BoundedSemaphore(CONVERSION_WORKERS)
+            _conversion_pool = ProcessPoolExecutor(
+                max_workers=CONVERSION_WORKERS,
+                mp_context=_conversion_mp_context,
+                initializer=init_conversion_process,
+                initargs=(ocr_slots,)
+            )
+            _conversion_pool_pid = os.getpid()
+        return _conversion_pool
+
+
+def reset_conversion_pool(pool=None, terminate=False):
+    """
+    Discard the conversion pool so the next request starts a new one.
+    
+    Args:
+        pool: Only discard the pool if it is still this one (default: the
+            current pool), so a pool another request just replaced survives
+        terminate: Also kill the pool's worker processes, stopping any
+            conversions still running in them
+    """
+    global _conversion_pool
+    with _conversion_pool_lock:
+        if _conversion_pool is None or (pool is not None and pool is not _conversion_pool):
+            return
+        pool, _conversion_pool = _conversion_pool, None
+    # The executor has no public way to stop running tasks, so its worker
+    # processes are terminated directly
+    processes = list((pool._processes or {}).values()) if terminate else []
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+@app.teardown_appcontext
+def shutdown_session(exception=None):
+    """Return the request's database session to the pool."""
+    db_session.remove()
+
+
+# Threads for the lightweight analysis pass when it overlaps LLM calls
+analysis_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='analysis')
+
+# Threads that run background conversion jobs (/api/convert with async=true)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
 
 
 class TimeoutError(Exception):
@@ -53,68 +143,174 @@ class TimeoutError(Exception):
     pass
 
 
-def run_with_timeout(func, args=(), kwargs=None, timeout_duration=300):
+class FileTooLargeError(Exception):
+    """Raised when an upload exceeds the configured maximum file size."""
+    pass
+
+
+# Uploads below this size that need no OCR are converted in the request
+# thread rather than in the conversion pool
+INLINE_CONVERSION_MAX_SIZE = 256 * 1024
+
+
+def run_conversion(filepath, max_ocr_pages, timeout_duration):
     """
-    Run a function with a timeout using threading.
+    Convert a file in the conversion pool with a timeout.
+    
+    A conversion that runs past the timeout is stopped by terminating the
+    pool's worker processes, which frees the CPU and memory it held. Other
+    conversions caught in a terminated (or otherwise broken) pool are
+    retried once on a fresh pool.
+    
+    Small files that are neither PDFs nor images (plain text, markdown,
+    small office documents) convert in well under the timeout, so they are
+    converted inline to skip the round trip to a worker process.
     
     Args:
-        func: Function to run
-        args: Positional arguments for the function
-        kwargs: Keyword arguments for the function
+        filepath: Path to the uploaded file
+        max_ocr_pages: Maximum number of PDF pages to OCR
         timeout_duration: Timeout in seconds
         
     Returns:
-        Result of the function
+        str: Markdown content
         
     Raises:
-        TimeoutError: If function execution exceeds timeout
+        TimeoutError: If the conversion exceeds the timeout
     """
-    if kwargs is None:
-        kwargs = {}
-    
-    result_queue = queue.Queue()
-    exception_queue = queue.Queue()
+    ext = os.path.splitext(filepath)[1].lower()
+    if (ext != '.pdf' and ext not in IMAGE_EXTENSIONS
+            and os.path.getsize(filepath) < INLINE_CONVERSION_MAX_SIZE):
+        return get_markitdown().convert(filepath).text_content
     
-    def worker():
+    for attempt in range(2):
+        pool = get_conversion_pool()
+        future = pool.submit(convert_file, filepath, max_ocr_pages)
         try:
-            result = func(*args, **kwargs)
-            result_queue.put(result)
-        except Exception as e:
-            exception_queue.put(e)
+            return future.result(timeout=timeout_duration)
+        except FutureTimeoutError:
+            if not future.cancel():
+                reset_conversion_pool(pool, terminate=True)
+            raise TimeoutError(f"Processing timeout exceeded ({timeout_duration} seconds)")
+        except BrokenProcessPool:
+            reset_conversion_pool(pool)
+            if attempt:
+                raise
+            logger.warning("Conversion pool was restarted, retrying conversion")
+
+
+# Chunk size used when copying uploads to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def save_upload(file, filepath, max_size=None):
+    """
+    Write an uploaded file to disk in a single pass, hashing it on the way.
     
-    thread = threading.Thread(target=worker)
-    thread.daemon = True
-    thread.start()
-    thread.join(timeout_duration)
+    Args:
+        file: Uploaded werkzeug FileStorage
+        filepath: Destination path
+        max_size: Maximum file size in bytes (None: no limit)
+        
+    Returns:
+        Tuple of (bytes written, hex content hash)
+        
+    Raises:
+        FileTooLargeError: If the upload exceeds max_size; the partial file
+            is removed and the rest of the upload is not written
+    """
+    file_size = 0
+    content_hash = hashlib.blake2b(digest_size=16)
+    # Chunks this size bypass the file object's buffer, so each one is a
+    # single write(). The pages are left in the cache on purpose: the
+    # converter reads the file straight back.
+    with open(filepath, 'wb') as out:
+        while True:
+            chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            file_size += len(chunk)
+            if max_size is not None and file_size > max_size:
+                break
+            out.write(chunk)
+            content_hash.update(chunk)
+    if max_size is not None and file_size > max_size:
+        os.remove(filepath)
+        raise FileTooLargeError(f"File exceeds the maximum size of {max_size} bytes")
+    return file_size, content_hash.hexdigest()
+
+
+def find_previous_conversion(content_hash, filename, max_ocr_pages):
+    """
+    Find an earlier conversion of byte-identical content.
     
-    if thread.is_alive():
-        # Thread is still running, timeout occurred
-        raise TimeoutError(f"Processing timeout exceeded ({timeout_duration} seconds)")
+    The extension must match too, since the same bytes convert differently
+    as e.g. .txt and .html. A PDF must also have been converted with the
+    same OCR page limit, since the limit changes how much of a scanned PDF
+    ends up in the markdown.
     
-    # Check if there was an exception
-    if not exception_queue.empty():
-        raise exception_queue.get()
+    Args:
+        content_hash: Hex content hash from save_upload()
+        filename: Name of the new upload
+        max_ocr_pages: OCR page limit the new upload would be converted with
+        
+    Returns:
+        Matching Conversion or None
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    candidates = db_session.query(Conversion).filter_by(
+        content_hash=content_hash
+    ).order_by(Conversion.id.desc()).limit(10)
+    for candidate in candidates:
+        if os.path.splitext(candidate.filename)[1].lower() != ext:
+            continue
+        if ext == '.pdf' and candidate.max_ocr_pages != max_ocr_pages:
+            continue
+        return candidate
+    return None
+
+
+# Rendered HTML of pages that take no template variables, keyed by
+# (template name, logged in, script root)
+_page_cache = {}
+
+
+def render_static_page(template_name):
+    """
+    Render a template that takes no variables, reusing the HTML of earlier renders.
     
-    # Get the result
-    if not result_queue.empty():
-        return result_queue.get()
+    The layout's navigation depends on whether a user is logged in and its
+    links on the prefix the app is mounted under, so the HTML is cached per
+    template, login state and script root. Flashed messages are part of the
+    page too, so while any are pending (and in debug mode, where templates
+    may change) the page is rendered normally.
     
-    raise Exception("Function did not return a result")
+    Args:
+        template_name: Template to render
+        
+    Returns:
+        str: Rendered HTML
+    """
+    if app.debug or '_flashes' in flask_session:
+        return render_template(template_name)
+    key = (template_name, current_user.is_authenticated, request.script_root)
+    html = _page_cache.get(key)
+    if html is None:
+        html = _page_cache[key] = render_template(template_name)
+    return html
 
 
 @login_manager.user_loader
 def load_user(user_id):
     """Load user by ID for Flask-Login."""
-    return db_session.query(User).get(int(user_id))
+    return db_session.get(User, int(user_id))
 
 
 def allowed_file(filename):
     """Check if file extension is allowed based on config."""
-    config = db_session.query(AppConfig).filter_by(key='allowed_extensions').first()
-    if config:
-        allowed_extensions = [ext.strip() for ext in config.value.split(',')]
-        return any(filename.lower().endswith(ext) for ext in allowed_extensions)
-    return True
+    extensions = config_cache.allowed_extensions
+    if not extensions:
+        return True
+    return filename.lower().endswith(extensions)
 
 
 @app.route('/')
@@ -132,12 +328,16 @@ def login():
         return redirect(url_for('upload_page'))
     
     if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
+        form = request.form.to_dict()
+        username = form.get('username')
+        password = form.get('password')
         
         user = db_session.query(User).filter_by(username=username).first()
         
         if user and user.check_password(password):
+            if user in db_session.dirty:
+                # Save the password hash upgraded by check_password
+                db_session.commit()
             login_user(user)
             next_page = request.args.get('next')
             # Validate next_page to prevent open redirect vulnerability
@@ -151,7 +351,7 @@ def login():
         else:
             flash('Invalid username or password', 'error')
     
-    return render_template('login.html')
+    return render_static_page('login.html')
 
 
 @app.route('/logout')
@@ -162,15 +362,31 @@ def logout():
     return redirect(url_for('login'))
 
 
+# Settings editable on the config page, with the message shown once saved
+CONFIG_FIELDS = (
+    ('allowed_extensions', 'Allowed extensions updated'),
+    ('max_file_size', 'Max file size updated'),
+    ('processing_timeout', 'Processing timeout updated'),
+    ('max_ocr_pages', 'Max OCR pages updated'),
+    ('llm_enabled', 'LLM processing setting updated'),
+    ('llm_task', 'LLM task updated'),
+    ('llm_max_tokens', 'LLM max tokens updated'),
+    ('llm_temperature', 'LLM temperature updated'),
+)
+
+
 @app.route('/config', methods=['GET', 'POST'])
 @login_required
 def config_page():
     """Application configuration page."""
     if request.method == 'POST':
+        form = request.form.to_dict()
+        
         # Update username and password
-        new_username = request.form.get('username')
-        new_password = request.form.get('password')
+        new_username = form.get('username')
+        new_password = form.get('password')
         
+        user_changed = False
         if new_username and new_username != current_user.username:
             # Check if username already exists
             existing = db_session.query(User).filter_by(username=new_username).first()
@@ -178,109 +394,46 @@ def config_page():
                 flash('Username already exists', 'error')
             else:
                 current_user.username = new_username
-                db_session.commit()
+                user_changed = True
                 flash('Username updated successfully', 'success')
         
         if new_password:
             current_user.set_password(new_password)
-            db_session.commit()
+            user_changed = True
             flash('Password updated successfully', 'success')
         
-        # Update allowed extensions
-        allowed_extensions = request.form.get('allowed_extensions')
-        if allowed_extensions:
-            config = db_session.query(AppConfig).filter_by(key='allowed_extensions').first()
-            if config:
-                config.value = allowed_extensions
-                db_session.commit()
-                flash('Allowed extensions updated', 'success')
-        
-        # Update max file size
-        max_file_size = request.form.get('max_file_size')
-        if max_file_size:
-            config = db_session.query(AppConfig).filter_by(key='max_file_size').first()
-            if config:
-                config.value = max_file_size
-                db_session.commit()
-                flash('Max file size updated', 'success')
-        
-        # Update processing timeout
-        processing_timeout = request.form.get('processing_timeout')
-        if processing_timeout:
-            config = db_session.query(AppConfig).filter_by(key='processing_timeout').first()
-            if config:
-                config.value = processing_timeout
-                db_session.commit()
-                flash('Processing timeout updated', 'success')
-        
-        # Update max OCR pages
-        max_ocr_pages = request.form.get('max_ocr_pages')
-        if max_ocr_pages:
-            config = db_session.query(AppConfig).filter_by(key='max_ocr_pages').first()
-            if config:
-                config.value = max_ocr_pages
-                db_session.commit()
-                flash('Max OCR pages updated', 'success')
-        
-        # Update LLM enabled
-        llm_enabled = request.form.get('llm_enabled')
-        if llm_enabled is not None:
-            config = db_session.query(AppConfig).filter_by(key='llm_enabled').first()
-            if config:
-                config.value = 'true' if llm_enabled == 'on' else 'false'
-                db_session.commit()
-                flash('LLM processing setting updated', 'success')
-        
-        # Update LLM task
-        llm_task = request.form.get('llm_task')
-        if llm_task:
-            config = db_session.query(AppConfig).filter_by(key='llm_task').first()
-            if config:
-                config.value = llm_task
-                db_session.commit()
-                flash('LLM task updated', 'success')
-        
-        # Update LLM max tokens
-        llm_max_tokens = request.form.get('llm_max_tokens')
-        if llm_max_tokens:
-            config = db_session.query(AppConfig).filter_by(key='llm_max_tokens').first()
-            if config:
-                config.value = llm_max_tokens
-                db_session.commit()
-                flash('LLM max tokens updated', 'success')
-        
-        # Update LLM temperature
-        llm_temperature = request.form.get('llm_temperature')
-        if llm_temperature:
-            config = db_session.query(AppConfig).filter_by(key='llm_temperature').first()
-            if config:
-                config.value = llm_temperature
-                db_session.commit()
-                flash('LLM temperature updated', 'success')
-    
-    # Get current config
-    allowed_ext_config = db_session.query(AppConfig).filter_by(key='allowed_extensions').first()
-    max_size_config = db_session.query(AppConfig).filter_by(key='max_file_size').first()
-    processing_timeout_config = db_session.query(AppConfig).filter_by(key='processing_timeout').first()
-    max_ocr_pages_config = db_session.query(AppConfig).filter_by(key='max_ocr_pages').first()
-    llm_enabled_config = db_session.query(AppConfig).filter_by(key='llm_enabled').first()
-    llm_task_config = db_session.query(AppConfig).filter_by(key='llm_task').first()
-    llm_max_tokens_config = db_session.query(AppConfig).filter_by(key='llm_max_tokens').first()
-    llm_temperature_config = db_session.query(AppConfig).filter_by(key='llm_temperature').first()
+        if user_changed:
+            db_session.commit()
+        
+        # Collect the submitted settings and save them in one transaction
+        updates = {}
+        for key, _ in CONFIG_FIELDS:
+            value = form.get(key)
+            if key == 'llm_enabled':
+                if value is not None:
+                    updates[key] = 'true' if value == 'on' else 'false'
+            elif value:
+                updates[key] = value
+        
+        updated = config_cache.set_many(updates)
+        for key, message in CONFIG_FIELDS:
+            if key in updated:
+                flash(message, 'success')
     
     # Get LLM model info
     model_info = get_model_info()
     
+    config = config_cache.snapshot()
     return render_template('config.html', 
                          username=current_user.username,
-                         allowed_extensions=allowed_ext_config.value if allowed_ext_config else '',
-                         max_file_size=max_size_config.value if max_size_config else '',
-                         processing_timeout=processing_timeout_config.value if processing_timeout_config else '300',
-                         max_ocr_pages=max_ocr_pages_config.value if max_ocr_pages_config else '50',
-                         llm_enabled=llm_enabled_config.value if llm_enabled_config else 'false',
-                         llm_task=llm_task_config.value if llm_task_config else 'summarize_and_correct',
-                         llm_max_tokens=llm_max_tokens_config.value if llm_max_tokens_config else '2048',
-                         llm_temperature=llm_temperature_config.value if llm_temperature_config else '0.7',
+                         allowed_extensions=config.get('allowed_extensions', ''),
+                         max_file_size=config.get('max_file_size', ''),
+                         processing_timeout=config.get('processing_timeout', '300'),
+                         max_ocr_pages=config.get('max_ocr_pages', '50'),
+                         llm_enabled=config.get('llm_enabled', 'false'),
+                         llm_task=config.get('llm_task', 'summarize_and_correct'),
+                         llm_max_tokens=config.get('llm_max_tokens', '2048'),
+                         llm_temperature=config.get('llm_temperature', '0.7'),
                          llm_model_info=model_info)
 
 
@@ -288,7 +441,14 @@ def config_page():
 @login_required
 def recent_conversions():
     """Page showing recent conversions in a table."""
-    conversions = db_session.query(Conversion).order_by(Conversion.upload_time.desc()).limit(50).all()
+    # Only the columns the table shows; the content columns can be megabytes per row
+    conversions = db_session.query(
+        Conversion.id,
+        Conversion.filename,
+        Conversion.predicted_title,
+        Conversion.upload_time,
+        Conversion.file_size
+    ).order_by(Conversion.upload_time.desc()).limit(50).all()
     return render_template('recent.html', conversions=conversions)
 
 
@@ -296,75 +456,116 @@ def recent_conversions():
 @login_required
 def upload_page():
     """Interactive upload page with chat-style interface."""
-    return render_template('upload.html')
+    return render_static_page('upload.html')
+
+
+# Available features
+FEATURE_TITLE = 'title_prediction'
+FEATURE_MARKDOWN = 'markdown_extraction'
+FEATURE_CATEGORY = 'document_categorization'
+FEATURE_KEYWORDS = 'keyword_extraction'
+FEATURE_SEVERITY = 'severity_classification'
+FEATURE_SUMMARY = 'summarization'
+FEATURE_CORRECTION = 'correction'
+ALL_FEATURES = frozenset({
+    FEATURE_TITLE, FEATURE_MARKDOWN, FEATURE_CATEGORY, FEATURE_KEYWORDS,
+    FEATURE_SEVERITY, FEATURE_SUMMARY, FEATURE_CORRECTION
+})
+# Features served by the lightweight analysis pass
+ANALYSIS_FEATURES = frozenset({FEATURE_TITLE, FEATURE_CATEGORY, FEATURE_KEYWORDS, FEATURE_SEVERITY})
+
+
+def submit_conversion_job(filepath, filename, file_size, content_hash, active_features, config):
+    """
+    Record a background conversion job and queue it on the job threads.
+    
+    Args:
+        Same as process_upload()
+        
+    Returns:
+        str: Job ID
+    """
+    job_id = secrets.token_hex(16)
+    db_session.add(ConversionJob(id=job_id, filename=filename))
+    db_session.commit()
+    job_executor.submit(
+        run_conversion_job, job_id,
+        filepath, filename, file_size, content_hash, active_features, config
+    )
+    return job_id
+
+
+def run_conversion_job(job_id, *args):
+    """Run process_upload() for a queued job and record its outcome."""
+    try:
+        job = db_session.get(ConversionJob, job_id)
+        job.status = JOB_RUNNING
+        db_session.commit()
+        
+        response_data, status = process_upload(*args)
+        if status == 200:
+            job.status = JOB_FINISHED
+            job.conversion_id = response_data['id']
+        else:
+            job.status = JOB_FAILED
+            job.error = response_data.get('error')
+        job.finished_at = datetime.utcnow()
+        db_session.commit()
+    except Exception as e:
+        logger.error(f"Conversion job {job_id} error: {str(e)}")
+        # Record the failure, or clients polling the job would see it
+        # running forever
+        try:
+            db_session.rollback()
+            job = db_session.get(ConversionJob, job_id)
+            if job is not None:
+                job.status = JOB_FAILED
+                job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                db_session.commit()
+        except Exception as e:
+            logger.error(f"Could not record failure of conversion job {job_id}: {str(e)}")
+    finally:
+        # Job threads are outside any request, so release the session here
+        db_session.remove()
 
 
-@app.route('/api/convert', methods=['POST'])
-@login_required
-def convert_document():
-    """API endpoint to convert uploaded document to markdown."""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
-    
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-    
-    if not allowed_file(file.filename):
-        return jsonify({'error': 'File type not allowed'}), 400
-    
-    # Get selected features from request
-    features = request.form.get('features', '')
-    selected_features = set(features.split(',')) if features else set()
+def process_upload(filepath, filename, file_size, content_hash, active_features, config):
+    """
+    Convert a saved upload, run the selected features and store the result.
     
-    # Available features
-    FEATURE_TITLE = 'title_prediction'
-    FEATURE_MARKDOWN = 'markdown_extraction'
-    FEATURE_CATEGORY = 'document_categorization'
-    FEATURE_KEYWORDS = 'keyword_extraction'
-    FEATURE_SEVERITY = 'severity_classification'
-    FEATURE_SUMMARY = 'summarization'
-    FEATURE_CORRECTION = 'correction'
+    Called directly by /api/convert, or on a job thread for background jobs.
     
-    filepath = None
-    try:
-        # Save the uploaded file
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(filepath)
-        
-        # Get file size
-        file_size = os.path.getsize(filepath)
+    Args:
+        filepath: Path of the saved upload
+        filename: Secured original filename
+        file_size: Upload size in bytes
+        content_hash: Hex content hash from save_upload()
+        active_features: Set of feature names to apply
+        config: Settings snapshot from config_cache.snapshot()
         
+    Returns:
+        Tuple of (response dict, HTTP status code)
+    """
+    try:
         # Get timeout and max OCR pages from config
-        timeout_config = db_session.query(AppConfig).filter_by(key='processing_timeout').first()
-        timeout_seconds = int(timeout_config.value) if timeout_config else 300
-        
-        max_ocr_pages_config = db_session.query(AppConfig).filter_by(key='max_ocr_pages').first()
-        max_ocr_pages = int(max_ocr_pages_config.value) if max_ocr_pages_config else 50
-        
-        # Define the conversion function
-        def do_conversion():
-            # Check if file is an image
-            if filepath.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')):
-                return extract_text_from_image(filepath)
-            elif filepath.lower().endswith('.pdf'):
-                return convert_pdf_with_ocr_fallback(filepath, md, max_pages=max_ocr_pages)
-            else:
-                result = md.convert(filepath)
-                return result.text_content
-        
-        # Convert to markdown with timeout (always performed)
-        try:
-            markdown_content = run_with_timeout(do_conversion, timeout_duration=timeout_seconds)
-        except TimeoutError:
-            # Clean up the file
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            return jsonify({'error': f'Processing timeout exceeded ({timeout_seconds} seconds)'}), 408
+        timeout_seconds = int(config.get('processing_timeout', 300))
+        max_ocr_pages = int(config.get('max_ocr_pages', 50))
+        
+        # Reuse the markdown of an identical earlier upload, otherwise
+        # convert with timeout
+        previous = find_previous_conversion(content_hash, filename, max_ocr_pages)
+        if previous:
+            logger.info(f"Reusing conversion {previous.id} for identical upload {filename}")
+            markdown_content = previous.markdown_content
+        else:
+            try:
+                markdown_content = run_conversion(filepath, max_ocr_pages, timeout_seconds)
+            except TimeoutError:
+                # Clean up the file
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                return {'error': f'Processing timeout exceeded ({timeout_seconds} seconds)'}, 408
         
         # Initialize result variables
         summary_content = None
@@ -375,69 +576,72 @@ def convert_document():
         severity_data = None
         
         # Check if LLM is enabled for title, summary, and correction
-        llm_enabled_config = db_session.query(AppConfig).filter_by(key='llm_enabled').first()
-        llm_enabled = llm_enabled_config and llm_enabled_config.value.lower() == 'true'
-        
-        # Process Title Prediction
-        if FEATURE_TITLE in selected_features or not selected_features:
+        llm_enabled = config.get('llm_enabled', 'false').lower() == 'true'
+        
+        # An identical earlier upload's LLM summary and correction are reused
+        # rather than generated again
+        if previous and llm_enabled:
+            if FEATURE_SUMMARY in active_features:
+                summary_content = previous.summary_content
+            if FEATURE_CORRECTION in active_features:
+                corrected_content = previous.corrected_content
+        
+        # Run the lightweight analyses (title heuristics, categories, keywords,
+        # severity) in a single fused pass over the content. With the LLM
+        # enabled the pass runs on a worker thread, overlapping the model calls
+        analysis = None
+        analysis_future = None
+        if ANALYSIS_FEATURES & active_features:
+            if llm_enabled:
+                analysis_future = analysis_executor.submit(analyze_document, markdown_content, max_keywords=10)
+            else:
+                try:
+                    analysis = analyze_document(markdown_content, max_keywords=10)
+                except Exception as e:
+                    logger.error(f"Document analysis error: {str(e)}")
+        
+        # When both the title and the summary are wanted, ask for them in a
+        # single call; anything the combined reply lacks is retried with its
+        # own call below. The corrected document is as long as the input, so
+        # it always gets a call and output budget of its own
+        if llm_enabled:
+            # Get LLM configuration
             try:
-                if llm_enabled:
-                    # Use LLM for title generation
-                    predicted_title = generate_title(markdown_content, max_tokens=50, temperature=0.5)
-                    if predicted_title:
-                        logger.info(f"Generated title (LLM): {predicted_title}")
-                
-                # Fallback to simple heuristics if LLM fails or not enabled
-                if not predicted_title:
-                    predicted_title = predict_title_simple(markdown_content)
-                    if predicted_title:
-                        logger.info(f"Generated title (heuristic): {predicted_title}")
-                        
+                llm_max_tokens = int(config.get('llm_max_tokens', 2048))
+                llm_temperature = float(config.get('llm_temperature', 0.7))
+            except ValueError as e:
+                logger.error(f"Invalid LLM configuration, using defaults: {str(e)}")
+                llm_max_tokens, llm_temperature = 2048, 0.7
+            
+            llm_fields = []
+            if FEATURE_TITLE in active_features:
+                llm_fields.append('title')
+            if FEATURE_SUMMARY in active_features and not summary_content:
+                llm_fields.append('summary')
+            if len(llm_fields) > 1:
+                combined = process_document_combined(
+                    markdown_content,
+                    want=tuple(llm_fields),
+                    max_tokens=llm_max_tokens,
+                    temperature=llm_temperature
+                ) or {}
+                predicted_title = combined.get('title')
+                summary_content = summary_content or combined.get('summary')
+        
+        # Process Title Prediction (LLM)
+        if FEATURE_TITLE in active_features and llm_enabled and not predicted_title:
+            try:
+                predicted_title = generate_title(markdown_content, max_tokens=50, temperature=0.5)
+                if predicted_title:
+                    logger.info(f"Generated title (LLM): {predicted_title}")
             except Exception as e:
                 logger.error(f"Title prediction error: {str(e)}")
                 predicted_title = None
         
-        # Process Categorization
-        if FEATURE_CATEGORY in selected_features or not selected_features:
-            try:
-                categories = predict_categories(markdown_content)
-                if categories:
-                    categories_data = json.dumps(categories)
-                    logger.info(f"Predicted {len(categories)} categories")
-            except Exception as e:
-                logger.error(f"Category prediction error: {str(e)}")
-        
-        # Process Keyword Extraction
-        if FEATURE_KEYWORDS in selected_features or not selected_features:
-            try:
-                keywords = extract_keywords(markdown_content, max_keywords=10)
-                if keywords:
-                    keywords_data = json.dumps(keywords)
-                    logger.info(f"Extracted {len(keywords)} keywords")
-            except Exception as e:
-                logger.error(f"Keyword extraction error: {str(e)}")
-        
-        # Process Severity Classification
-        if FEATURE_SEVERITY in selected_features or not selected_features:
-            try:
-                severity = predict_severity(markdown_content)
-                if severity:
-                    severity_data = severity.get('severity', 'Normal')
-                    logger.info(f"Predicted severity: {severity_data}")
-            except Exception as e:
-                logger.error(f"Severity prediction error: {str(e)}")
-        
         # Process Summarization
-        if FEATURE_SUMMARY in selected_features or not selected_features:
-            if llm_enabled:
+        if FEATURE_SUMMARY in active_features:
+            if llm_enabled and not summary_content:
                 try:
-                    # Get LLM configuration
-                    llm_max_tokens_config = db_session.query(AppConfig).filter_by(key='llm_max_tokens').first()
-                    llm_max_tokens = int(llm_max_tokens_config.value) if llm_max_tokens_config else 2048
-                    
-                    llm_temperature_config = db_session.query(AppConfig).filter_by(key='llm_temperature').first()
-                    llm_temperature = float(llm_temperature_config.value) if llm_temperature_config else 0.7
-                    
                     logger.info(f"Processing summarization with LLM")
                     
                     # Process document with LLM for summarization
@@ -458,16 +662,9 @@ def convert_document():
                     summary_content = None
         
         # Process Correction
-        if FEATURE_CORRECTION in selected_features or not selected_features:
-            if llm_enabled:
+        if FEATURE_CORRECTION in active_features:
+            if llm_enabled and not corrected_content:
                 try:
-                    # Get LLM configuration
-                    llm_max_tokens_config = db_session.query(AppConfig).filter_by(key='llm_max_tokens').first()
-                    llm_max_tokens = int(llm_max_tokens_config.value) if llm_max_tokens_config else 2048
-                    
-                    llm_temperature_config = db_session.query(AppConfig).filter_by(key='llm_temperature').first()
-                    llm_temperature = float(llm_temperature_config.value) if llm_temperature_config else 0.7
-                    
                     logger.info(f"Processing correction with LLM")
                     
                     # Process document with LLM for correction only
@@ -487,10 +684,46 @@ def convert_document():
                     logger.error(f"Correction error: {str(e)}")
                     corrected_content = None
         
-        # Save to database
-        conversion = Conversion(
+        # Collect the analysis pass if it ran alongside the LLM calls
+        if analysis_future is not None:
+            try:
+                analysis = analysis_future.result()
+            except Exception as e:
+                logger.error(f"Document analysis error: {str(e)}")
+        
+        # Fallback to simple heuristics if LLM fails or not enabled
+        if FEATURE_TITLE in active_features and not predicted_title and analysis:
+            predicted_title = analysis['title']
+            if predicted_title:
+                logger.info(f"Generated title (heuristic): {predicted_title}")
+        
+        # Process Categorization
+        if FEATURE_CATEGORY in active_features and analysis:
+            categories = analysis['categories']
+            if categories:
+                categories_data = orjson.dumps(categories).decode()
+                logger.info(f"Predicted {len(categories)} categories")
+        
+        # Process Keyword Extraction
+        if FEATURE_KEYWORDS in active_features and analysis:
+            keywords = analysis['keywords']
+            if keywords:
+                keywords_data = orjson.dumps(keywords).decode()
+                logger.info(f"Extracted {len(keywords)} keywords")
+        
+        # Process Severity Classification
+        if FEATURE_SEVERITY in active_features and analysis:
+            severity = analysis['severity']
+            if severity:
+                severity_data = severity.get('severity', 'Normal')
+                logger.info(f"Predicted severity: {severity_data}")
+        
+        # Save to database (group-committed by the background writer)
+        conversion_id, upload_time = conversion_writer.submit(
             filename=filename,
             original_path=filepath,
+            content_hash=content_hash,
+            max_ocr_pages=max_ocr_pages,
             markdown_content=markdown_content,
             summary_content=summary_content,
             predicted_title=predicted_title,
@@ -499,31 +732,29 @@ def convert_document():
             keywords=keywords_data,
             severity=severity_data,
             corrected_content=corrected_content
-        )
-        db_session.add(conversion)
-        db_session.commit()
+        ).result()
         
         # Return response with all available data
         response_data = {
             'success': True,
-            'id': conversion.id,
-            'filename': conversion.filename,
-            'upload_time': conversion.upload_time.isoformat(),
-            'file_size': conversion.file_size
+            'id': conversion_id,
+            'filename': filename,
+            'upload_time': upload_time.isoformat(),
+            'file_size': file_size
         }
         
         # Add features based on selection or defaults
-        if FEATURE_MARKDOWN in selected_features or not selected_features:
-            response_data['markdown_content'] = conversion.markdown_content
+        if FEATURE_MARKDOWN in active_features:
+            response_data['markdown_content'] = markdown_content
         
         if predicted_title:
             response_data['predicted_title'] = predicted_title
         
         if categories_data:
-            response_data['categories'] = json.loads(categories_data)
+            response_data['categories'] = categories
         
         if keywords_data:
-            response_data['keywords'] = json.loads(keywords_data)
+            response_data['keywords'] = keywords
         
         if severity_data:
             response_data['severity'] = severity_data
@@ -534,7 +765,7 @@ def convert_document():
         if corrected_content:
             response_data['corrected_content'] = corrected_content
         
-        return jsonify(response_data)
+        return response_data, 200
     
     except Exception as e:
         # Clean up the file if it exists
@@ -542,14 +773,90 @@ def convert_document():
             os.remove(filepath)
         # Log the error but don't expose stack trace to user
         app.logger.error(f"Conversion error: {str(e)}")
+        return {'error': 'An error occurred during conversion'}, 500
+
+
+@app.route('/api/convert', methods=['POST'])
+@login_required
+def convert_document():
+    """
+    API endpoint to convert uploaded document to markdown.
+    
+    With the form field async=true the upload is converted in the background;
+    the response is 202 with a job id to poll at /api/job/<job_id>.
+    """
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'File type not allowed'}), 400
+    
+    # Get selected features from request; no selection means every feature
+    features = request.form.get('features', '')
+    active_features = frozenset(features.split(',')) if features else ALL_FEATURES
+    run_async = request.form.get('async', '').lower() in ('1', 'true', 'yes')
+    
+    filepath = None
+    try:
+        # Save the uploaded file
+        filename = secure_filename(file.filename)
+        # Hex nanosecond timestamp keeps names in upload order; the random
+        # suffix keeps concurrent uploads of the same name apart
+        unique_filename = f"{time.time_ns():x}_{secrets.token_hex(4)}_{filename}"
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+        
+        # Read every setting this request needs from one snapshot
+        config = config_cache.snapshot()
+        
+        try:
+            max_file_size = int(config.get('max_file_size', 0)) or None
+        except ValueError:
+            max_file_size = None
+        try:
+            file_size, content_hash = save_upload(file, filepath, max_size=max_file_size)
+        except FileTooLargeError:
+            filepath = None
+            return jsonify({'error': f'File too large (maximum {max_file_size} bytes)'}), 413
+    except Exception as e:
+        # Clean up the file if it exists
+        if filepath and os.path.exists(filepath):
+            os.remove(filepath)
+        app.logger.error(f"Upload error: {str(e)}")
         return jsonify({'error': 'An error occurred during conversion'}), 500
+    
+    if run_async:
+        job_id = submit_conversion_job(filepath, filename, file_size, content_hash, active_features, config)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': JOB_QUEUED,
+            'status_url': url_for('get_job', job_id=job_id)
+        }), 202
+    
+    response_data, status = process_upload(filepath, filename, file_size, content_hash, active_features, config)
+    return jsonify(response_data), status
 
 
 @app.route('/conversion/<int:conversion_id>')
 @login_required
 def conversion_detail(conversion_id):
     """Page showing detailed information about a specific conversion."""
-    conversion = db_session.query(Conversion).get(conversion_id)
+    # Only the columns the page shows; the corrected content and analysis
+    # JSON are left unread
+    conversion = db_session.get(Conversion, conversion_id, options=[load_only(
+        Conversion.filename,
+        Conversion.original_path,
+        Conversion.markdown_content,
+        Conversion.summary_content,
+        Conversion.predicted_title,
+        Conversion.upload_time,
+        Conversion.file_size
+    )])
     if not conversion:
         flash('Conversion not found', 'error')
         return redirect(url_for('recent_conversions'))
@@ -557,7 +864,7 @@ def conversion_detail(conversion_id):
     # Determine file type for preview
     file_ext = os.path.splitext(conversion.filename)[1].lower()
     is_pdf = file_ext == '.pdf'
-    is_image = file_ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff']
+    is_image = file_ext in IMAGE_EXTENSIONS
     
     return render_template('detail.html', 
                          conversion=conversion,
@@ -570,17 +877,43 @@ def conversion_detail(conversion_id):
 def serve_upload(filename):
     """Serve uploaded files for preview."""
     from flask import send_from_directory
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    accel_location = app.config['UPLOADS_ACCEL_REDIRECT']
+    if not accel_location:
+        # Uploads are saved relative to the working directory, while a
+        # relative directory here would be resolved against the app's root
+        return send_from_directory(os.path.abspath(app.config['UPLOAD_FOLDER']), filename)
+    
+    # Let nginx send the file; only the path check and headers happen here
+    path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    response = app.response_class()
+    response.headers['X-Accel-Redirect'] = accel_location.rstrip('/') + '/' + quote(filename)
+    response.headers['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    return response
+
+
+# Largest page /api/conversions returns
+MAX_CONVERSIONS_PAGE = 200
 
 
 @app.route('/api/conversions')
 @login_required
 def get_conversions():
-    """API endpoint to get list of conversions."""
-    limit = request.args.get('limit', 50, type=int)
-    conversions = db_session.query(Conversion).order_by(Conversion.upload_time.desc()).limit(limit).all()
+    """API endpoint to get a page of conversions, newest first."""
+    # Full rows include the content columns, so a page is capped rather than
+    # letting one request load the whole table
+    limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_CONVERSIONS_PAGE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    conversions = db_session.query(Conversion).options(
+        undefer_group('content')
+    ).order_by(
+        Conversion.upload_time.desc()
+    ).offset(offset).limit(limit).all()
     return jsonify({
-        'conversions': [c.to_dict() for c in conversions]
+        'conversions': [c.to_dict() for c in conversions],
+        'limit': limit,
+        'offset': offset
     })
 
 
@@ -588,12 +921,27 @@ def get_conversions():
 @login_required
 def get_conversion(conversion_id):
     """API endpoint to get a specific conversion."""
-    conversion = db_session.query(Conversion).get(conversion_id)
+    conversion = db_session.get(Conversion, conversion_id, options=[undefer_group('content')])
     if not conversion:
         return jsonify({'error': 'Conversion not found'}), 404
     return jsonify(conversion.to_dict())
 
 
+@app.route('/api/job/<job_id>')
+@login_required
+def get_job(job_id):
+    """API endpoint to get the status of a background conversion job."""
+    job = db_session.get(ConversionJob, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    result = job.to_dict()
+    if job.status == JOB_FINISHED:
+        conversion = db_session.get(Conversion, job.conversion_id, options=[undefer_group('content')])
+        if conversion:
+            result['result'] = conversion.to_dict()
+    return jsonify(result)
+
+
 if __name__ == '__main__':
     # Use environment variable to control debug mode
     # Never set debug=True in production
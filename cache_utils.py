@@ -0,0 +1,85 @@
+"""Content-addressed result caching shared by the analysis and LLM utilities."""
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Optional
+
+try:
+    # XXH3 hashes several times faster than BLAKE2b; the digests are only
+    # compared within this process, so either algorithm can key the cache
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+def content_hash(text: str) -> bytes:
+    """Return a compact 64-bit digest of the text used as a cache key."""
+    data = text.encode('utf-8', 'surrogatepass')
+    if xxhash is not None:
+        return xxhash.xxh3_64_digest(data)
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+
+def cached_by_content(
+    maxsize: int = 512,
+    max_text_length: Optional[int] = None,
+    cache_none: bool = True,
+    ignore_kwargs: tuple = ()
+):
+    """
+    Memoize a function on a hash of its first (text) argument.
+
+    Entries are keyed on the text's digest plus the remaining arguments, so the
+    cache never holds on to whole documents. Results are deep-copied on the
+    way out so callers may mutate them freely.
+
+    Args:
+        maxsize: Maximum number of cached results (least recently used evicted)
+        max_text_length: Texts longer than this bypass the cache (None: no limit)
+        cache_none: Whether a None result is cached; disable for functions that
+            return None on transient failures
+        ignore_kwargs: Keyword arguments left out of the key because they do
+            not change the result
+
+    Returns:
+        Decorator; the wrapped function gains a cache_clear() method
+    """
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(text, *args, **kwargs):
+            if not isinstance(text, str) or (max_text_length is not None and len(text) > max_text_length):
+                return func(text, *args, **kwargs)
+
+            key_kwargs = tuple(sorted(
+                (name, value) for name, value in kwargs.items() if name not in ignore_kwargs
+            ))
+            key = (content_hash(text), args, key_kwargs)
+            try:
+                hash(key)
+            except TypeError:
+                # Unhashable arguments (e.g. lists) are simply not cached
+                return func(text, *args, **kwargs)
+
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return copy.deepcopy(cache[key])
+
+            result = func(text, *args, **kwargs)
+            if result is None and not cache_none:
+                return result
+            with lock:
+                cache[key] = result
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return copy.deepcopy(result)
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
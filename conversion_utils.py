@@ -0,0 +1,64 @@
+"""Document conversion helpers that can run in a separate worker process."""
+import os
+
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff'})
+
+# MarkItDown instance of the current process, created on first use so that
+# worker processes build their own
+_markitdown = None
+
+
+def init_conversion_process(ocr_slots=None):
+    """
+    Prepare a conversion pool worker process.
+
+    Keeps Tesseract single-threaded in the worker, since pages and other
+    conversions already run in parallel. The limit is set before the worker
+    imports ocr_utils, because OpenMP reads it once when libtesseract loads;
+    tesseract subprocesses inherit it from the worker's environment.
+
+    Args:
+        ocr_slots: Semaphore shared by the pool's processes that bounds how
+            many pages they OCR at once
+    """
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    if ocr_slots is not None:
+        from ocr_utils import set_ocr_slots
+        set_ocr_slots(ocr_slots)
+
+
+def get_markitdown():
+    """Return this process's MarkItDown instance, creating it if needed."""
+    global _markitdown
+    if _markitdown is None:
+        from markitdown import MarkItDown
+        _markitdown = MarkItDown()
+    return _markitdown
+
+
+def convert_file(filepath, max_ocr_pages=50):
+    """
+    Convert a document on disk to markdown.
+
+    Images go through OCR, PDFs through MarkItDown with an OCR fallback for
+    scanned documents, and everything else through MarkItDown.
+
+    Args:
+        filepath: Path to the uploaded file
+        max_ocr_pages: Maximum number of PDF pages to OCR
+
+    Returns:
+        str: Markdown content
+    """
+    # Imported here so only the processes that convert pay for the OCR stack
+    # (pytesseract pulls in pandas), not the web server process
+    from ocr_utils import convert_pdf_with_ocr_fallback, extract_text_from_image
+
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return extract_text_from_image(filepath)
+    elif ext == '.pdf':
+        return convert_pdf_with_ocr_fallback(filepath, get_markitdown(), max_pages=max_ocr_pages)
+    else:
+        result = get_markitdown().convert(filepath)
+        return result.text_content
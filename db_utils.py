@@ -0,0 +1,268 @@
+"""Database helpers for the markitdown API application."""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlalchemy.orm import sessionmaker
+from models import Conversion, AppConfig
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on queued rows; submitters block once it is reached
+WRITE_QUEUE_SIZE = 1024
+# Maximum number of rows committed together in one transaction
+WRITE_BATCH_SIZE = 64
+# Seconds cached settings are trusted before they are re-read, so changes
+# made by other processes are picked up
+CONFIG_CACHE_TTL = 30
+
+_STOP = object()
+
+
+class ConversionWriter:
+    """
+    Single writer thread that inserts Conversion rows in group commits.
+
+    Request threads hand over the column values with submit() and get back a
+    Future. The writer drains whatever has queued up since its last commit,
+    inserts it in one transaction, and resolves each Future with the row's
+    (id, upload_time). Concurrent uploads therefore share one commit instead
+    of each paying for its own.
+    """
+
+    def __init__(self, engine, maxsize=WRITE_QUEUE_SIZE, batch_size=WRITE_BATCH_SIZE):
+        self._session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+        self._maxsize = maxsize
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def submit(self, **values):
+        """
+        Queue a Conversion row for insertion.
+
+        Args:
+            **values: Column values for the new Conversion
+
+        Returns:
+            Future resolving to (id, upload_time) once the row is committed
+        """
+        future = Future()
+        self._ensure_started().put((values, future))
+        return future
+
+    def close(self, timeout=10):
+        """Flush pending rows and stop the writer thread."""
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                return
+            thread, write_queue = self._thread, self._queue
+            self._thread = None
+        write_queue.put(_STOP)
+        thread.join(timeout)
+
+    def _ensure_started(self):
+        """Start the writer thread on first use in this process."""
+        with self._lock:
+            # Threads do not survive fork(), so worker processes that inherit
+            # this object get a fresh queue and thread of their own
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue(maxsize=self._maxsize)
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name='conversion-writer', daemon=True
+                )
+                self._pid = os.getpid()
+                self._thread.start()
+            return self._queue
+
+    def _run(self, write_queue):
+        """Writer loop: block for one row, then take everything else queued."""
+        while True:
+            item = write_queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self._batch_size:
+                try:
+                    item = write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        """
+        Insert a batch of rows in a single transaction.
+
+        If the transaction fails, the rows are retried one at a time so a
+        single bad row only fails its own request.
+        """
+        session = self._session_factory()
+        try:
+            rows = [Conversion(**values) for values, _ in batch]
+            session.add_all(rows)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(batch) > 1:
+                logger.warning(f"Batch insert failed, retrying rows individually: {str(e)}")
+                for item in batch:
+                    self._write_batch([item])
+            else:
+                logger.error(f"Error writing conversion: {str(e)}")
+                batch[0][1].set_exception(e)
+            return
+        finally:
+            session.close()
+
+        for row, (_, future) in zip(rows, batch):
+            future.set_result((row.id, row.upload_time))
+
+
+def parse_extensions(value):
+    """
+    Parse a comma-separated extensions config value into filename suffixes.
+
+    The result is a tuple so it can be passed straight to str.endswith, which
+    also matches compound extensions such as .tar.gz.
+    """
+    extensions = (ext.strip().lower().lstrip('.') for ext in value.split(','))
+    return tuple(sorted({'.' + ext for ext in extensions if ext}))
+
+
+class ConfigCache:
+    """
+    In-process copy of the AppConfig table.
+
+    All settings are loaded with one query and served from a dict. set()
+    writes through to the database and updates the dict, so changes apply
+    immediately in this process; other processes see them once their copy
+    is older than the TTL.
+
+    Values that need parsing before use are derived once per change rather
+    than on every read, e.g. allowed_extensions.
+    """
+
+    def __init__(self, engine, ttl=CONFIG_CACHE_TTL):
+        self._session_factory = sessionmaker(bind=engine)
+        self._ttl = ttl
+        self._lock = threading.RLock()
+        self._cache = {}
+        self._allowed_extensions = None
+        self._loaded_at = None
+
+    def reload(self):
+        """Load every setting from the database."""
+        session = self._session_factory()
+        try:
+            values = dict(session.query(AppConfig.key, AppConfig.value).all())
+        finally:
+            session.close()
+        with self._lock:
+            self._cache = values
+            self._update_derived()
+            self._loaded_at = time.monotonic()
+
+    def _update_derived(self):
+        """Recompute the parsed forms of cached settings."""
+        value = self._cache.get('allowed_extensions')
+        self._allowed_extensions = parse_extensions(value) if value is not None else None
+
+    def get(self, key, default=None):
+        """
+        Get a setting value.
+
+        Args:
+            key: Setting name
+            default: Value returned if the setting does not exist
+
+        Returns:
+            The setting's string value, or default
+        """
+        with self._lock:
+            self._refresh_if_stale()
+            return self._cache.get(key, default)
+
+    def snapshot(self):
+        """
+        Get all settings at once, for handlers that read several of them.
+
+        The returned dict is never modified afterwards (updates replace it),
+        so it gives a consistent view without copying.
+
+        Returns:
+            Dict of setting name to string value
+        """
+        with self._lock:
+            self._refresh_if_stale()
+            return self._cache
+
+    def _refresh_if_stale(self):
+        """Reload the settings if the cached copy is older than the TTL."""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self._ttl:
+            self.reload()
+
+    @property
+    def allowed_extensions(self):
+        """
+        Allowed upload extensions, parsed when the setting was loaded.
+
+        Returns:
+            Tuple of lowercase suffixes including the dot, or None if the
+            setting does not exist
+        """
+        with self._lock:
+            self._refresh_if_stale()
+            return self._allowed_extensions
+
+    def set(self, key, value):
+        """
+        Update an existing setting in the database and in the cache.
+
+        Args:
+            key: Setting name
+            value: New string value
+
+        Returns:
+            bool: True if the setting exists and was updated
+        """
+        return key in self.set_many({key: value})
+
+    def set_many(self, values):
+        """
+        Update several existing settings in a single transaction.
+
+        Args:
+            values: Dict of setting name to new string value
+
+        Returns:
+            set: Names of the settings that exist and were updated
+        """
+        if not values:
+            return set()
+        with self._lock:
+            session = self._session_factory()
+            try:
+                configs = session.query(AppConfig).filter(AppConfig.key.in_(list(values))).all()
+                for config in configs:
+                    config.value = values[config.key]
+                session.commit()
+                updated = {config.key for config in configs}
+            finally:
+                session.close()
+            # Replace rather than mutate the dict so earlier snapshots stay intact
+            self._cache = {**self._cache, **{key: values[key] for key in updated}}
+            self._update_derived()
+            return updated
@@ -8,14 +8,8 @@ import sys
 import os
 sys.path.insert(0, '/home/runner/work/markitdown-api/markitdown-api')
 
-def mock_llm_response(content, task):
-    """
-    Mock LLM response to demonstrate the expected output.
-    In reality, this would come from the Qwen1.5-1.8B model.
-    """
-    if task == "summarize_and_correct":
-        # Example of what the LLM would produce: corrected spelling/grammar + summarized
-        return """# Laporan Kemajuan Proyek - Q4 2024
+# Example of what the LLM would produce: corrected spelling/grammar + summarized
+SUMMARY_RESPONSE = """# Laporan Kemajuan Proyek - Q4 2024
 
 ## Ringkasan Eksekutif
 
@@ -53,9 +47,9 @@ Proyek berjalan sesuai jadwal dan mencapai semua milestone yang ditargetkan untu
 ---
 *Catatan: Koreksi yang dilakukan oleh AI meliputi perbaikan ejaan "menunjukan" → "menunjukkan", "implemntasikan" → "implementasikan", "berbgai" → "berbagai", dan penyederhanaan struktur untuk kemudahan pembacaan.*
 """
-    else:  # correct_only
-        # Just correct spelling/grammar without summarizing
-        return """# Laporan Kemajuan Proyek - Q4 2024
+
+# Just correct spelling/grammar without summarizing
+CORRECT_RESPONSE = """# Laporan Kemajuan Proyek - Q4 2024
 
 ## Ringkasan Eksekutif
 
@@ -111,6 +105,19 @@ Proyek berjalan sesuai jadwal dan telah mencapai milestone yang direncanakan. Ti
 *Dokumen ini dibuat untuk mendemonstrasikan kemampuan koreksi dan summarisasi dalam Bahasa Indonesia*
 """
 
+MOCK_RESPONSES = {
+    "summarize_and_correct": SUMMARY_RESPONSE,
+    "correct_only": CORRECT_RESPONSE,
+}
+
+
+def mock_llm_response(content, task):
+    """
+    Mock LLM response to demonstrate the expected output.
+    In reality, this would come from the Qwen1.5-1.8B model.
+    """
+    return MOCK_RESPONSES.get(task, CORRECT_RESPONSE)
+
 
 def demo_llm_processing():
     """Demonstrate LLM processing with sample Indonesian document."""
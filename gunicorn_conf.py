@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration for running the markitdown API in production.
+
+Usage:
+    gunicorn -c gunicorn_conf.py app:app
+
+Every setting can be overridden with the environment variables below.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Conversions run in each worker's own process pool (CONVERSION_WORKERS), so
+# a few threaded workers are enough to keep every core busy; more workers
+# would each start another pool and, with the LLM enabled, load another copy
+# of the model
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+# Split the cores between the workers' conversion pools unless set explicitly;
+# read by app.py, which the master imports after this file
+os.environ.setdefault('CONVERSION_WORKERS', str(max(1, (os.cpu_count() or 1) // workers)))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Must exceed the longest allowed processing timeout (config page, default
+# 300 seconds) plus the LLM calls that follow a conversion
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 600))
+graceful_timeout = 30
+
+# Import the app once in the master so database setup runs once and workers
+# share the loaded modules through copy-on-write
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Give each worker its own database connections and LLM model."""
+    from app import engine, config_cache
+    from llm_utils import ensure_llm_loaded
+    # Connections opened in the master during setup must not be shared
+    # between processes; drop them without closing the master's sockets
+    engine.dispose(close=False)
+    # The model is never loaded in the master: a GPU context does not
+    # survive fork(), so each worker loads its own before taking requests
+    if config_cache.get('llm_enabled', 'false').lower() == 'true':
+        ensure_llm_loaded()
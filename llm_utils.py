@@ -1,13 +1,78 @@
 """LLM utilities for document summarization and correction using Qwen1.5-1.8B."""
 import os
+import json
+import functools
 import logging
-from typing import Optional, Dict
+import threading
+import time
+from typing import Optional, Dict, List
+
+from cache_utils import cached_by_content
 
 logger = logging.getLogger(__name__)
 
 # Global model instance (lazy loaded)
 _llm_model = None
 
+# Number of LLM outputs kept per function, keyed on a hash of the document
+# and the generation parameters. Failed generations (None) are not cached.
+LLM_CACHE_SIZE = 256
+_cached_llm_output = cached_by_content(maxsize=LLM_CACHE_SIZE, cache_none=False)
+
+# Fields that process_document_combined() can request, with the instruction
+# given to the model for each. They are always requested in this order,
+# shortest first, so a reply cut off at the token limit still has the
+# short fields complete
+COMBINED_FIELDS = {
+    'title': 'a clear, descriptive title for the document (max 10-15 words)',
+    'summary': 'the corrected content summarized into concise, well-structured paragraphs in markdown',
+    'corrected': 'the full document with spelling, grammar and markdown formatting corrected, without summarizing',
+}
+
+# Seconds the model file lookup in get_model_info() is reused before the
+# filesystem is checked again
+MODEL_INFO_TTL = 60
+_model_info_cache = None  # (checked_at, model_path, model_exists)
+
+# System message shared by all document prompts
+DOCUMENT_SYSTEM_PROMPT = (
+    "You are a helpful assistant that processes documents written in "
+    "Bahasa Indonesia and English."
+)
+
+# Instructions given after the document for each process_document() task
+TASK_INSTRUCTIONS = {
+    'summarize_and_correct': """Process the document above. Your tasks are:
+1. Correct any spelling and grammar errors (especially for Bahasa Indonesia and English)
+2. Reformat the markdown if needed for better readability
+3. Summarize the content into concise, well-structured paragraphs
+4. Maintain the original meaning and important details
+
+Output only the corrected and summarized content in markdown format.""",
+    'correct_only': """Correct the document above. Your tasks are:
+1. Correct any spelling and grammar errors (especially for Bahasa Indonesia and English)
+2. Reformat the markdown if needed for better readability
+3. Maintain all original content without summarizing
+
+Output only the corrected content in markdown format.""",
+}
+
+# Document length limit for models without a tokenizer; otherwise documents
+# are truncated by tokens to fit the context window
+MAX_INPUT_CHARS = 8000
+TRUNCATION_NOTE = "\n\n[Content truncated...]"
+
+# Characters of the document given to the model for title generation
+TITLE_INPUT_CHARS = 2000
+
+# Serializes loading and unloading the model. Reentrant because
+# ensure_llm_loaded() holds it while calling initialize_llm()
+_llm_init_lock = threading.RLock()
+
+# A llama.cpp model holds a single context, so generations must not run
+# concurrently; request threads take turns through this lock
+_llm_lock = threading.Lock()
+
 
 def get_model_path():
     """Get the path to the LLM model file."""
@@ -24,46 +89,124 @@ def get_model_path():
     return None
 
 
-def initialize_llm(model_path: Optional[str] = None, n_ctx: int = 4096, n_gpu_layers: int = 0) -> bool:
+def get_gpu_layers(llama_cpp_module) -> int:
+    """
+    Get the number of model layers to offload to the GPU.
+    
+    Uses the QWEN_GPU_LAYERS environment variable if set; otherwise offloads
+    every layer (-1) when llama-cpp-python was built with GPU support, and
+    none when it was not.
+    
+    Args:
+        llama_cpp_module: The imported llama_cpp module
+        
+    Returns:
+        int: Layers to offload (-1 for all, 0 for CPU-only)
+    """
+    value = os.environ.get('QWEN_GPU_LAYERS')
+    if value:
+        try:
+            return int(value)
+        except ValueError:
+            logger.warning(f"Invalid QWEN_GPU_LAYERS value: {value}")
+    try:
+        return -1 if llama_cpp_module.llama_supports_gpu_offload() else 0
+    except Exception:
+        return 0
+
+
+# KV cache types selectable with QWEN_KV_QUANT, as llama_cpp GGML type names.
+# Quantized caches use less memory per context token, so a larger n_ctx fits
+# in the same RAM
+KV_CACHE_TYPES = {
+    'f16': 'GGML_TYPE_F16',
+    'q8_0': 'GGML_TYPE_Q8_0',
+    'q4_0': 'GGML_TYPE_Q4_0',
+}
+
+
+def get_kv_cache_type(llama_cpp_module) -> Optional[int]:
+    """
+    Get the KV cache type requested with the QWEN_KV_QUANT environment variable.
+    
+    Args:
+        llama_cpp_module: The imported llama_cpp module
+        
+    Returns:
+        GGML type constant for a quantized cache, or None to keep llama.cpp's
+        default f16 cache
+    """
+    value = os.environ.get('QWEN_KV_QUANT', 'f16').strip().lower()
+    if value not in KV_CACHE_TYPES:
+        logger.warning(f"Invalid QWEN_KV_QUANT value: {value}, using f16")
+        return None
+    if value == 'f16':
+        return None
+    return getattr(llama_cpp_module, KV_CACHE_TYPES[value])
+
+
+def initialize_llm(model_path: Optional[str] = None, n_ctx: int = 4096, n_gpu_layers: Optional[int] = None) -> bool:
     """
     Initialize the LLM model for inference.
     
     Args:
         model_path: Path to the GGUF model file. If None, uses default path.
         n_ctx: Context window size (default: 4096)
-        n_gpu_layers: Number of layers to offload to GPU (default: 0 for CPU-only)
+        n_gpu_layers: Number of layers to offload to GPU. If None, uses
+            get_gpu_layers() (all layers when a GPU build is installed)
         
     Returns:
         bool: True if initialization successful, False otherwise
     """
     global _llm_model
     
-    try:
-        from llama_cpp import Llama
-        
-        if model_path is None:
-            model_path = get_model_path()
+    with _llm_init_lock:
+        try:
+            import llama_cpp
+            from llama_cpp import Llama
+            
+            if model_path is None:
+                model_path = get_model_path()
+            
+            if n_gpu_layers is None:
+                n_gpu_layers = get_gpu_layers(llama_cpp)
+            kv_cache_type = get_kv_cache_type(llama_cpp)
+            kv_cache_options = {}
+            if kv_cache_type is not None:
+                kv_cache_options = {'type_k': kv_cache_type, 'type_v': kv_cache_type}
+            
+            if model_path is None or not os.path.exists(model_path):
+                logger.error(f"Model file not found at {model_path}")
+                return False
+            
+            logger.info(f"Loading LLM model from {model_path} ({n_gpu_layers} GPU layers)")
+            _llm_model = Llama(
+                model_path=model_path,
+                n_ctx=n_ctx,
+                n_gpu_layers=n_gpu_layers,
+                n_batch=512,
+                # Fused attention kernel; worthwhile once layers run on the GPU,
+                # and required by llama.cpp for a quantized V cache
+                flash_attn=n_gpu_layers != 0 or kv_cache_type is not None,
+                verbose=False,
+                **kv_cache_options
+            )
+            logger.info("LLM model loaded successfully")
+            clear_llm_cache()
+            return True
         
-        if model_path is None or not os.path.exists(model_path):
-            logger.error(f"Model file not found at {model_path}")
+        except ImportError:
+            logger.error("llama-cpp-python not installed. Install with: pip install llama-cpp-python")
             return False
-        
-        logger.info(f"Loading LLM model from {model_path}")
-        _llm_model = Llama(
-            model_path=model_path,
-            n_ctx=n_ctx,
-            n_gpu_layers=n_gpu_layers,
-            verbose=False
-        )
-        logger.info("LLM model loaded successfully")
-        return True
-        
-    except ImportError:
-        logger.error("llama-cpp-python not installed. Install with: pip install llama-cpp-python")
-        return False
-    except Exception as e:
-        logger.error(f"Failed to initialize LLM model: {str(e)}")
-        return False
+        except Exception as e:
+            logger.error(f"Failed to initialize LLM model: {str(e)}")
+            return False
+
+
+def clear_llm_cache():
+    """Drop cached LLM outputs, e.g. after a different model is loaded."""
+    for func in (process_document, process_document_combined, generate_title):
+        func.cache_clear()
 
 
 def is_model_loaded() -> bool:
@@ -71,50 +214,124 @@ def is_model_loaded() -> bool:
     return _llm_model is not None
 
 
-def create_prompt(markdown_content: str, task: str = "summarize_and_correct") -> str:
+def ensure_llm_loaded() -> bool:
     """
-    Create a prompt for the LLM based on the task.
+    Load the LLM model on first use.
+    
+    Request threads that find no model wait for a single load instead of
+    each loading their own copy.
+    
+    Returns:
+        bool: True if a model is loaded
+    """
+    if _llm_model is not None:
+        return True
+    with _llm_init_lock:
+        if _llm_model is not None:
+            return True
+        logger.warning("LLM model not loaded, attempting to initialize")
+        return initialize_llm()
+
+
+def _generate(prompt: str, **kwargs) -> Optional[Dict[str, any]]:
+    """
+    Run a completion on the shared model, one generation at a time.
+    
+    Args:
+        prompt: Full prompt text
+        **kwargs: Sampling options passed to the model
+        
+    Returns:
+        The model's completion response, or None if no model is loaded
+    """
+    with _llm_lock:
+        model = _llm_model
+        if model is None:
+            return None
+        return model(prompt, **kwargs)
+
+
+def build_fitted_prompt(markdown_content: str, build_prompt, max_tokens: int) -> str:
+    """
+    Build a prompt, truncating the document so it fits the context window.
+    
+    The document is cut by tokens so that the prompt plus max_tokens of
+    output fits the model's context. Models without a tokenizer fall back to
+    a fixed character limit.
     
     Args:
         markdown_content: The markdown content to process
-        task: Type of task ("summarize_and_correct" or "correct_only")
+        build_prompt: Function that builds the full prompt from the content
+        max_tokens: Tokens reserved for the generated output
         
     Returns:
         str: Formatted prompt for the LLM
     """
-    if task == "summarize_and_correct":
-        prompt = f"""<|im_start|>system
-You are a helpful assistant that processes documents. Your tasks are:
-1. Correct any spelling and grammar errors (especially for Bahasa Indonesia and English)
-2. Reformat the markdown if needed for better readability
-3. Summarize the content into concise, well-structured paragraphs
-4. Maintain the original meaning and important details
+    model = _llm_model
+    if not hasattr(model, 'tokenize'):
+        if len(markdown_content) > MAX_INPUT_CHARS:
+            logger.warning(f"Document too long ({len(markdown_content)} chars), truncating to {MAX_INPUT_CHARS}")
+            markdown_content = markdown_content[:MAX_INPUT_CHARS] + TRUNCATION_NOTE
+        return build_prompt(markdown_content)
+    
+    n_ctx = model.n_ctx()
+    overhead = len(model.tokenize(build_prompt(TRUNCATION_NOTE).encode('utf-8'), special=True))
+    # Keep at least half the context for the document when a large output
+    # budget would leave no room; llama.cpp then shortens the output instead
+    budget = max(n_ctx - max_tokens - overhead, n_ctx // 2)
+    tokens = model.tokenize(markdown_content.encode('utf-8'), add_bos=False)
+    if len(tokens) > budget:
+        logger.warning(f"Document too long ({len(tokens)} tokens), truncating to {budget}")
+        truncated = model.detokenize(tokens[:budget]).decode('utf-8', errors='ignore')
+        markdown_content = truncated + TRUNCATION_NOTE
+    return build_prompt(markdown_content)
+
 
-Output only the corrected and summarized content in markdown format.<|im_end|>
+def create_document_prompt(markdown_content: str, instructions: str) -> str:
+    """
+    Create a prompt with the document first and the task instructions last.
+    
+    Every task on a document uses the same system message and document text,
+    so its prompts share a long token prefix. llama.cpp keeps the previous
+    prompt's evaluated tokens and only processes what differs, so the second
+    and later tasks on the same document skip re-reading it.
+    
+    Args:
+        markdown_content: The markdown content to process
+        instructions: Task instructions placed after the document
+        
+    Returns:
+        str: Formatted prompt for the LLM
+    """
+    return f"""<|im_start|>system
+{DOCUMENT_SYSTEM_PROMPT}<|im_end|>
 <|im_start|>user
-Process this document:
+Document:
 
-{markdown_content}<|im_end|>
+{markdown_content}
+
+{instructions}<|im_end|>
 <|im_start|>assistant
 """
-    else:  # correct_only
-        prompt = f"""<|im_start|>system
-You are a helpful assistant that corrects documents. Your tasks are:
-1. Correct any spelling and grammar errors (especially for Bahasa Indonesia and English)
-2. Reformat the markdown if needed for better readability
-3. Maintain all original content without summarizing
 
-Output only the corrected content in markdown format.<|im_end|>
-<|im_start|>user
-Correct this document:
 
-{markdown_content}<|im_end|>
-<|im_start|>assistant
-"""
+def create_prompt(markdown_content: str, task: str = "summarize_and_correct") -> str:
+    """
+    Create a prompt for the LLM based on the task.
     
-    return prompt
+    Args:
+        markdown_content: The markdown content to process
+        task: Type of task ("summarize_and_correct" or "correct_only")
+        
+    Returns:
+        str: Formatted prompt for the LLM
+    """
+    if task not in TASK_INSTRUCTIONS:
+        task = "correct_only"
+    return create_document_prompt(markdown_content, TASK_INSTRUCTIONS[task])
 
 
+@_cached_llm_output
 def process_document(
     markdown_content: str,
     task: str = "summarize_and_correct",
@@ -135,26 +352,19 @@ def process_document(
     """
     global _llm_model
     
-    if not is_model_loaded():
-        logger.warning("LLM model not loaded, attempting to initialize")
-        if not initialize_llm():
-            logger.error("Failed to initialize LLM model")
-            return None
+    if not ensure_llm_loaded():
+        logger.error("Failed to initialize LLM model")
+        return None
     
     try:
-        # Create prompt
-        prompt = create_prompt(markdown_content, task)
-        
-        # Truncate input if too long (leave room for output)
-        max_input_chars = 8000  # Approximate limit for context
-        if len(markdown_content) > max_input_chars:
-            logger.warning(f"Document too long ({len(markdown_content)} chars), truncating to {max_input_chars}")
-            markdown_content = markdown_content[:max_input_chars] + "\n\n[Content truncated...]"
-            prompt = create_prompt(markdown_content, task)
+        # Create prompt, truncating the document to fit the context window
+        prompt = build_fitted_prompt(
+            markdown_content, lambda content: create_prompt(content, task), max_tokens
+        )
         
         # Generate response
         logger.info(f"Processing document with task: {task}")
-        response = _llm_model(
+        response = _generate(
             prompt,
             max_tokens=max_tokens,
             temperature=temperature,
@@ -176,6 +386,187 @@ def process_document(
         return None
 
 
+def create_combined_prompt(markdown_content: str, fields: List[str]) -> str:
+    """
+    Create a prompt asking for several outputs as one JSON object.
+    
+    Args:
+        markdown_content: The markdown content to process
+        fields: Keys of COMBINED_FIELDS to request
+        
+    Returns:
+        str: Formatted prompt for the LLM
+    """
+    field_lines = "\n".join(f'- "{field}": {COMBINED_FIELDS[field]}' for field in fields)
+    instructions = f"""Process the document above. Correct spelling and grammar
+(especially for Bahasa Indonesia and English) and keep the document's language.
+
+Respond with a single JSON object containing exactly these keys:
+{field_lines}
+
+Output only the JSON object."""
+    return create_document_prompt(markdown_content, instructions)
+
+
+def parse_json_fields(text: str) -> Dict[str, any]:
+    """
+    Read the key/value pairs of the first JSON object in text.
+    
+    Pairs are read one at a time, so a reply that was cut off mid-object
+    still yields every pair that was completed before the cut.
+    
+    Args:
+        text: Model reply, possibly with text around the object
+        
+    Returns:
+        Dict of the complete pairs, empty if no object was found
+    """
+    decoder = json.JSONDecoder()
+    result = {}
+    start = text.find('{')
+    if start == -1:
+        return result
+    index = start + 1
+    try:
+        while True:
+            while text[index].isspace():
+                index += 1
+            if text[index] == '}':
+                return result
+            key, index = decoder.raw_decode(text, index)
+            while text[index].isspace():
+                index += 1
+            if text[index] != ':':
+                return result
+            index += 1
+            while text[index].isspace():
+                index += 1
+            value, index = decoder.raw_decode(text, index)
+            if isinstance(key, str):
+                result[key] = value
+            while text[index].isspace():
+                index += 1
+            if text[index] != ',':
+                return result
+            index += 1
+    except (IndexError, ValueError):
+        # The reply ends (or breaks) here; keep the pairs read so far
+        return result
+
+
+@functools.lru_cache(maxsize=16)
+def get_combined_grammar(fields: tuple):
+    """
+    Build a grammar that constrains the model to the combined JSON reply.
+    
+    Sampling is restricted to a JSON object with exactly the requested string
+    fields, so the reply always parses instead of occasionally falling back
+    to one call per field.
+    
+    Args:
+        fields: Keys of COMBINED_FIELDS that are requested
+        
+    Returns:
+        LlamaGrammar, or None if llama-cpp-python is unavailable
+    """
+    try:
+        from llama_cpp import LlamaGrammar
+        schema = {
+            'type': 'object',
+            'properties': {field: {'type': 'string'} for field in fields},
+            'required': list(fields),
+        }
+        return LlamaGrammar.from_json_schema(json.dumps(schema), verbose=False)
+    except Exception as e:
+        logger.warning(f"JSON grammar unavailable, combined output is unconstrained: {str(e)}")
+        return None
+
+
+@_cached_llm_output
+def process_document_combined(
+    markdown_content: str,
+    want: List[str] = ('title', 'summary', 'corrected'),
+    max_tokens: int = 2048,
+    temperature: float = 0.7
+) -> Optional[Dict[str, str]]:
+    """
+    Generate several outputs (title, summary, corrected content) in one LLM call.
+    
+    The document is only evaluated once instead of once per task. The model
+    is asked for a JSON object; fields it leaves out or leaves empty, or that
+    a reply cut off at the token limit did not finish, are omitted from the
+    result so callers can fall back to individual calls.
+    
+    Each field gets its own max_tokens of output, so the reply is allowed
+    max_tokens times the number of fields, capped at half the context window.
+    
+    Args:
+        markdown_content: The markdown content to process
+        want: Keys of COMBINED_FIELDS to request
+        max_tokens: Maximum tokens to generate per field
+        temperature: Sampling temperature (0.0 to 1.0)
+        
+    Returns:
+        Optional[Dict[str, str]]: Requested fields that were produced, or None
+        if generation failed or the reply held no JSON object
+    """
+    fields = [field for field in COMBINED_FIELDS if field in want]
+    if not fields:
+        return {}
+    
+    if not ensure_llm_loaded():
+        logger.error("Failed to initialize LLM model")
+        return None
+    
+    try:
+        logger.info(f"Processing document with combined tasks: {', '.join(fields)}")
+        # build_fitted_prompt() keeps at least half the context for the
+        # document, so the reply can use at most the other half
+        output_tokens = max_tokens * len(fields)
+        if hasattr(_llm_model, 'n_ctx'):
+            output_tokens = min(output_tokens, _llm_model.n_ctx() // 2)
+        options = {}
+        grammar = get_combined_grammar(tuple(fields))
+        if grammar is not None:
+            options['grammar'] = grammar
+        response = _generate(
+            build_fitted_prompt(
+                markdown_content, lambda content: create_combined_prompt(content, fields), output_tokens
+            ),
+            max_tokens=output_tokens,
+            temperature=temperature,
+            stop=["<|im_end|>", "<|endoftext|>"],
+            echo=False,
+            **options
+        )
+        
+        if not response or 'choices' not in response or len(response['choices']) == 0:
+            logger.error("No response generated from LLM")
+            return None
+        
+        # Read the JSON object's fields, ignoring any text around it
+        text = response['choices'][0]['text']
+        if '{' not in text:
+            logger.error("Combined LLM response did not contain a JSON object")
+            return None
+        data = parse_json_fields(text)
+        
+        result = {}
+        for field in fields:
+            value = data.get(field)
+            if isinstance(value, str) and value.strip():
+                result[field] = value.strip()
+        if 'title' in result:
+            result['title'] = result['title'].strip('"\'').strip()
+        logger.info(f"Combined processing produced: {', '.join(result) or 'nothing'}")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error processing document with LLM: {str(e)}")
+        return None
+
+
+@_cached_llm_output
 def generate_title(
     markdown_content: str,
     max_tokens: int = 50,
@@ -194,33 +585,23 @@ def generate_title(
     """
     global _llm_model
     
-    if not is_model_loaded():
-        logger.warning("LLM model not loaded, attempting to initialize")
-        if not initialize_llm():
-            logger.error("Failed to initialize LLM model")
-            return None
+    if not ensure_llm_loaded():
+        logger.error("Failed to initialize LLM model")
+        return None
     
     try:
         # Create a specialized prompt for title generation
-        prompt = f"""<|im_start|>system
-You are a helpful assistant that generates concise document titles. Your task is to:
-1. Read the document content carefully
-2. Identify the main topic and purpose
-3. Generate a clear, descriptive title (max 10-15 words)
-4. Output ONLY the title without any additional text or formatting
+        prompt = create_document_prompt(markdown_content[:TITLE_INPUT_CHARS], """Generate a title for the document above. Your task is to:
+1. Identify the main topic and purpose
+2. Generate a clear, descriptive title (max 10-15 words)
+3. Output ONLY the title without any additional text or formatting
 
 For documents in Bahasa Indonesia, provide the title in Bahasa Indonesia.
-For documents in English, provide the title in English.<|im_end|>
-<|im_start|>user
-Generate a title for this document:
-
-{markdown_content[:2000]}<|im_end|>
-<|im_start|>assistant
-"""
+For documents in English, provide the title in English.""")
         
         # Generate title
         logger.info("Generating document title with LLM")
-        response = _llm_model(
+        response = _generate(
             prompt,
             max_tokens=max_tokens,
             temperature=temperature,
@@ -251,17 +632,27 @@ def get_model_info() -> Dict[str, any]:
     Returns:
         Dict with model information (loaded status, path, etc.)
     """
-    model_path = get_model_path()
+    global _model_info_cache
+    
+    now = time.monotonic()
+    if _model_info_cache is None or now - _model_info_cache[0] >= MODEL_INFO_TTL:
+        model_path = get_model_path()
+        model_exists = model_path is not None and os.path.exists(model_path)
+        _model_info_cache = (now, model_path, model_exists)
+    _, model_path, model_exists = _model_info_cache
+    
     return {
         'loaded': is_model_loaded(),
         'model_path': model_path,
-        'model_exists': model_path is not None and os.path.exists(model_path) if model_path else False
+        'model_exists': model_exists
     }
 
 
 def unload_model():
     """Unload the LLM model from memory."""
     global _llm_model
-    if _llm_model is not None:
-        _llm_model = None
-        logger.info("LLM model unloaded")
+    with _llm_init_lock:
+        if _llm_model is not None:
+            _llm_model = None
+            clear_llm_cache()
+            logger.info("LLM model unloaded")
@@ -17,11 +17,39 @@ import sqlite3
 from pathlib import Path
 
 
-def check_column_exists(cursor, table_name, column_name):
-    """Check if a column exists in a table."""
+# Columns added to the conversions table since the first release, with their
+# SQL types, in the order they were introduced
+NEW_COLUMNS = [
+    ('summary_content', 'TEXT'),
+    ('predicted_title', 'VARCHAR(500)'),
+    ('categories', 'TEXT'),
+    ('keywords', 'TEXT'),
+    ('severity', 'VARCHAR(50)'),
+    ('corrected_content', 'TEXT'),
+    ('content_hash', 'VARCHAR(64)'),
+    ('max_ocr_pages', 'INTEGER'),
+]
+
+
+def get_table_columns(cursor, table_name):
+    """Return the set of column names in a table."""
     cursor.execute(f"PRAGMA table_info({table_name})")
-    columns = [row[1] for row in cursor.fetchall()]
-    return column_name in columns
+    return {row[1] for row in cursor.fetchall()}
+
+
+def check_index_exists(cursor, index_name):
+    """Check if an index exists in the database."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,))
+    return cursor.fetchone() is not None
+
+
+def tune_connection(cursor):
+    """Apply the journal and cache settings used for the migration connection."""
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
 
 
 def migrate_database(db_path):
@@ -34,88 +62,52 @@ def migrate_database(db_path):
     
     print(f"Migrating database: {db_path}")
     
+    conn = None
     try:
-        # Connect to the database
+        # Connect to the database, using the same journal settings as the app
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
+        tune_connection(cursor)
+        
+        # Apply all changes in one transaction, so they are synced to disk
+        # once and either all land or none do
+        cursor.execute("BEGIN")
         
         # Track if any migration was performed
         migration_performed = False
         
-        # Check and add summary_content column if needed
-        if not check_column_exists(cursor, 'conversions', 'summary_content'):
-            print("Adding 'summary_content' column to 'conversions' table...")
-            cursor.execute("""
-                ALTER TABLE conversions 
-                ADD COLUMN summary_content TEXT
-            """)
-            migration_performed = True
-            print("✓ Successfully added 'summary_content' column")
-        else:
-            print("✓ Column 'summary_content' already exists")
-        
-        # Check and add predicted_title column if needed
-        if not check_column_exists(cursor, 'conversions', 'predicted_title'):
-            print("Adding 'predicted_title' column to 'conversions' table...")
-            cursor.execute("""
-                ALTER TABLE conversions 
-                ADD COLUMN predicted_title VARCHAR(500)
-            """)
-            migration_performed = True
-            print("✓ Successfully added 'predicted_title' column")
-        else:
-            print("✓ Column 'predicted_title' already exists")
-        
-        # Check and add categories column if needed
-        if not check_column_exists(cursor, 'conversions', 'categories'):
-            print("Adding 'categories' column to 'conversions' table...")
-            cursor.execute("""
-                ALTER TABLE conversions 
-                ADD COLUMN categories TEXT
-            """)
-            migration_performed = True
-            print("✓ Successfully added 'categories' column")
-        else:
-            print("✓ Column 'categories' already exists")
-        
-        # Check and add keywords column if needed
-        if not check_column_exists(cursor, 'conversions', 'keywords'):
-            print("Adding 'keywords' column to 'conversions' table...")
-            cursor.execute("""
-                ALTER TABLE conversions 
-                ADD COLUMN keywords TEXT
-            """)
-            migration_performed = True
-            print("✓ Successfully added 'keywords' column")
-        else:
-            print("✓ Column 'keywords' already exists")
-        
-        # Check and add severity column if needed
-        if not check_column_exists(cursor, 'conversions', 'severity'):
-            print("Adding 'severity' column to 'conversions' table...")
-            cursor.execute("""
-                ALTER TABLE conversions 
-                ADD COLUMN severity VARCHAR(50)
-            """)
+        # Check and add each missing column
+        existing_columns = get_table_columns(cursor, 'conversions')
+        for column_name, column_type in NEW_COLUMNS:
+            if column_name in existing_columns:
+                print(f"✓ Column '{column_name}' already exists")
+                continue
+            
+            print(f"Adding '{column_name}' column to 'conversions' table...")
+            cursor.execute(f"ALTER TABLE conversions ADD COLUMN {column_name} {column_type}")
+            if column_name == 'content_hash':
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS ix_conversions_content_hash
+                    ON conversions (content_hash)
+                """)
             migration_performed = True
-            print("✓ Successfully added 'severity' column")
-        else:
-            print("✓ Column 'severity' already exists")
+            print(f"✓ Successfully added '{column_name}' column")
         
-        # Check and add corrected_content column if needed
-        if not check_column_exists(cursor, 'conversions', 'corrected_content'):
-            print("Adding 'corrected_content' column to 'conversions' table...")
+        # Check and add upload_time index if needed
+        if not check_index_exists(cursor, 'ix_conversions_upload_time'):
+            print("Adding 'ix_conversions_upload_time' index...")
             cursor.execute("""
-                ALTER TABLE conversions 
-                ADD COLUMN corrected_content TEXT
+                CREATE INDEX ix_conversions_upload_time
+                ON conversions (upload_time DESC)
             """)
             migration_performed = True
-            print("✓ Successfully added 'corrected_content' column")
+            print("✓ Successfully added 'ix_conversions_upload_time' index")
         else:
-            print("✓ Column 'corrected_content' already exists")
+            print("✓ Index 'ix_conversions_upload_time' already exists")
         
         if not migration_performed:
             print("No migration needed - all columns already exist.")
+            conn.rollback()
             conn.close()
             return True
         
@@ -126,14 +118,22 @@ def migrate_database(db_path):
         count = cursor.fetchone()[0]
         print(f"✓ Existing records ({count}) will have NULL for new columns (can be filled later)")
         
+        # Refresh the query planner's statistics for the new columns and indexes
+        cursor.execute("PRAGMA optimize")
         conn.close()
         return True
             
     except sqlite3.Error as e:
         print(f"✗ Database error: {e}")
+        if conn is not None:
+            conn.rollback()
+            conn.close()
         return False
     except Exception as e:
         print(f"✗ Unexpected error: {e}")
+        if conn is not None:
+            conn.rollback()
+            conn.close()
         return False
 
 
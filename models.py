@@ -1,10 +1,20 @@
 """Database models for the markitdown API application."""
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
+import orjson
+from sqlalchemy import create_engine, event, insert, Column, Integer, String, Text, DateTime, Boolean, Index
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session, deferred
 from werkzeug.security import generate_password_hash, check_password_hash
 
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHashError, VerificationError
+    password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+except ImportError:
+    # Without argon2-cffi, passwords are hashed with werkzeug's scrypt
+    password_hasher = None
+
 Base = declarative_base()
 
 
@@ -19,12 +29,41 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
-        """Hash and set the user's password."""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set the user's password, with argon2 when available."""
+        if password_hasher is not None:
+            self.password_hash = password_hasher.hash(password)
+        else:
+            self.password_hash = generate_password_hash(password)
     
     def check_password(self, password):
-        """Verify the user's password."""
-        return check_password_hash(self.password_hash, password)
+        """
+        Verify the user's password.
+        
+        Hashes made by werkzeug or with outdated argon2 parameters are
+        replaced on a successful check; the caller commits the change.
+        
+        Args:
+            password: Plain-text password to check
+            
+        Returns:
+            bool: True if the password matches
+        """
+        if self.password_hash.startswith('$argon2'):
+            if password_hasher is None:
+                return False
+            try:
+                password_hasher.verify(self.password_hash, password)
+            except (VerificationError, InvalidHashError):
+                return False
+            if password_hasher.check_needs_rehash(self.password_hash):
+                self.password_hash = password_hasher.hash(password)
+            return True
+        
+        if not check_password_hash(self.password_hash, password):
+            return False
+        if password_hasher is not None:
+            self.set_password(password)
+        return True
     
     def get_id(self):
         """Return the user ID as a string (required by Flask-Login)."""
@@ -53,8 +92,10 @@ class Conversion(Base):
     id = Column(Integer, primary_key=True)
     filename = Column(String(255), nullable=False)
     original_path = Column(String(500), nullable=False)
-    markdown_content = Column(Text, nullable=False)
-    summary_content = Column(Text)  # LLM-processed summary and corrections
+    # The document bodies are loaded only when first accessed, all three in
+    # one query, so queries that just need metadata don't read them
+    markdown_content = deferred(Column(Text, nullable=False), group='content')
+    summary_content = deferred(Column(Text), group='content')  # LLM-processed summary and corrections
     predicted_title = Column(String(500))  # LLM-predicted document title
     upload_time = Column(DateTime, default=datetime.utcnow)
     file_size = Column(Integer)  # in bytes
@@ -63,12 +104,17 @@ class Conversion(Base):
     categories = Column(Text)  # JSON string of predicted categories
     keywords = Column(Text)  # JSON string of extracted keywords
     severity = Column(String(50))  # Predicted severity level
-    corrected_content = Column(Text)  # Spell/grammar corrected content
+    corrected_content = deferred(Column(Text), group='content')  # Spell/grammar corrected content
+    content_hash = Column(String(64), index=True)  # Hash of the uploaded bytes
+    max_ocr_pages = Column(Integer)  # OCR page limit the upload was converted with
+    
+    # Newest-first listings read rows straight off this index instead of sorting
+    __table_args__ = (
+        Index('ix_conversions_upload_time', upload_time.desc()),
+    )
     
     def to_dict(self):
         """Convert the conversion to a dictionary."""
-        import json
-        
         result = {
             'id': self.id,
             'filename': self.filename,
@@ -82,7 +128,7 @@ class Conversion(Base):
         # Parse JSON fields
         if self.categories:
             try:
-                result['categories'] = json.loads(self.categories)
+                result['categories'] = orjson.loads(self.categories)
             except:
                 result['categories'] = None
         else:
@@ -90,7 +136,7 @@ class Conversion(Base):
             
         if self.keywords:
             try:
-                result['keywords'] = json.loads(self.keywords)
+                result['keywords'] = orjson.loads(self.keywords)
             except:
                 result['keywords'] = None
         else:
@@ -102,6 +148,38 @@ class Conversion(Base):
         return result
 
 
+# Background conversion job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_FINISHED = 'finished'
+JOB_FAILED = 'failed'
+
+
+class ConversionJob(Base):
+    """Background conversion job submitted through the API."""
+    __tablename__ = 'conversion_jobs'
+    
+    id = Column(String(32), primary_key=True)
+    filename = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False, default=JOB_QUEUED)
+    conversion_id = Column(Integer)  # Set once the job has finished
+    error = Column(Text)  # Set if the job failed
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+    
+    def to_dict(self):
+        """Convert the job to a dictionary."""
+        return {
+            'job_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'conversion_id': self.conversion_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
 class AppConfig(Base):
     """Application configuration model."""
     __tablename__ = 'app_config'
@@ -112,9 +190,64 @@ class AppConfig(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
-def init_db(database_url='sqlite:///markitdown.db'):
-    """Initialize the database and create tables."""
-    engine = create_engine(database_url)
+def init_db(database_url='sqlite:///markitdown.db', pool_size=20, max_overflow=10, pool_recycle=1800):
+    """
+    Initialize the database and create tables.
+    
+    Args:
+        database_url: SQLAlchemy database URL
+        pool_size: Connections kept open in the pool
+        max_overflow: Extra connections allowed beyond pool_size under load
+        pool_recycle: Seconds after which pooled connections are replaced
+        
+    Returns:
+        SQLAlchemy engine
+    """
+    url = make_url(database_url)
+    engine_kwargs = {}
+    is_sqlite = url.get_backend_name() == 'sqlite'
+    in_memory = is_sqlite and url.database in (None, '', ':memory:')
+    
+    # In-memory SQLite keeps its single connection per thread, so only
+    # file and server databases get a sized connection pool
+    if not in_memory:
+        engine_kwargs.update(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=False
+        )
+    if is_sqlite:
+        # Pooled connections are handed between request and worker threads
+        engine_kwargs['connect_args'] = {'check_same_thread': False}
+    
+    engine = create_engine(database_url, **engine_kwargs)
+    
+    if is_sqlite and not in_memory:
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            # WAL lets readers proceed during writes, and with it
+            # synchronous=NORMAL only syncs at checkpoints instead of on
+            # every commit
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            # Serve reads of large markdown rows from a memory map and a
+            # bigger page cache, and keep temporary sort tables in memory
+            cursor.execute('PRAGMA mmap_size=268435456')
+            cursor.execute('PRAGMA cache_size=-16000')
+            cursor.execute('PRAGMA temp_store=MEMORY')
+            cursor.close()
+        
+        @event.listens_for(engine, 'close')
+        def optimize_sqlite(dbapi_connection, connection_record):
+            # Let SQLite refresh planner statistics it found lacking while
+            # the connection was in use
+            try:
+                dbapi_connection.execute('PRAGMA optimize')
+            except Exception:
+                pass
+    
     Base.metadata.create_all(engine)
     return engine
 
@@ -125,6 +258,18 @@ def get_session(engine):
     return Session()
 
 
+def get_scoped_session(engine):
+    """
+    Create a thread-local session registry.
+    
+    Each thread gets its own session from the engine's connection pool;
+    call remove() on the registry when a request finishes. Objects are not
+    expired on commit, since a request's session is discarded right after
+    and reloading them would only cost extra queries.
+    """
+    return scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+
+
 def init_default_user(session):
     """Initialize default admin user if not exists."""
     user = session.query(User).filter_by(username='admin').first()
@@ -149,10 +294,13 @@ def init_default_config(session):
         ('llm_temperature', '0.7'),  # Temperature for LLM sampling
     ]
     
-    for key, value in configs:
-        config = session.query(AppConfig).filter_by(key=key).first()
-        if not config:
-            config = AppConfig(key=key, value=value)
-            session.add(config)
-    
-    session.commit()
+    existing = {
+        key for (key,) in session.query(AppConfig.key).filter(
+            AppConfig.key.in_([key for key, _ in configs])
+        )
+    }
+    missing = [{'key': key, 'value': value} for key, value in configs if key not in existing]
+    if missing:
+        # One executemany INSERT instead of building ORM objects per row
+        session.execute(insert(AppConfig), missing)
+        session.commit()
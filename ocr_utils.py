@@ -1,15 +1,91 @@
 """OCR utility functions for handling scanned PDFs."""
+import functools
 import os
 import tempfile
-from pdf2image import convert_from_path
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pdf2image import convert_from_path, pdfinfo_from_path
 import pytesseract
 from PIL import Image
 
+# Number of pages of one document OCR'd at once. Tesseract runs outside the
+# GIL (as a subprocess, or in C++ through tesserocr), so threads are enough
+# to keep several cores busy. Conversions running side by side share the
+# cores through the semaphore given to set_ocr_slots().
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', os.cpu_count() or 1))
+
+try:
+    # Binds Tesseract's C++ API, avoiding a subprocess and a language model
+    # load for every page
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+try:
+    # Renders pages in memory with MuPDF instead of running pdftoppm and
+    # round-tripping each page through a PNG file
+    import fitz
+except ImportError:
+    fitz = None
+
+# Extra Tesseract options for pytesseract. --oem 1 selects the LSTM engine
+# alone, skipping the legacy engine's slower combined mode; page segmentation
+# stays automatic so multi-column pages keep their reading order.
+TESSERACT_CONFIG = os.environ.get('TESSERACT_CONFIG', '--oem 1')
+
+# Resolution pages are OCR'd at. Tesseract's cost grows with pixel count, and
+# printed text is recognized just as well at 250 DPI as at 300.
+OCR_DPI = 250
+
+# Number of leading pages checked for a text layer before treating a PDF as
+# scanned
+TEXT_PROBE_PAGES = 3
+
+# Tesseract API handle of each OCR thread, when tesserocr is installed
+_tesseract_local = threading.local()
+
+# Thread pool that OCRs PDF pages, created on first use in each process
+_ocr_executor = None
+_ocr_executor_lock = threading.Lock()
+
+# Semaphore shared by the processes of a conversion pool, bounding the pages
+# OCR'd at once across all of their conversions (None: no shared bound)
+_ocr_slots = None
+
+
+def set_ocr_slots(slots):
+    """
+    Bound concurrent page OCR with a semaphore shared between processes.
+    
+    Args:
+        slots: multiprocessing semaphore, or None to remove the bound
+    """
+    global _ocr_slots
+    _ocr_slots = slots
+
+
+def get_ocr_executor():
+    """
+    Return this process's page OCR thread pool, creating it if needed.
+    
+    The pool is kept for the life of the process so that its threads, and
+    their Tesseract API handles, are reused across documents.
+    """
+    global _ocr_executor
+    with _ocr_executor_lock:
+        if _ocr_executor is None:
+            _ocr_executor = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix='ocr')
+        return _ocr_executor
+
 
 def has_text_in_pdf(pdf_path):
     """
     Check if a PDF contains extractable text.
     
+    Only the first TEXT_PROBE_PAGES pages are parsed, and the check stops at
+    the first text that is more than whitespace. Results are cached per file
+    version, so converting the same unchanged file again skips the parse.
+    
     Args:
         pdf_path: Path to the PDF file
         
@@ -17,46 +93,227 @@ def has_text_in_pdf(pdf_path):
         bool: True if PDF contains text, False otherwise
     """
     try:
-        # Try to extract text using pdfminer
-        from pdfminer.high_level import extract_text
-        text = extract_text(pdf_path)
-        # Consider PDF as having text if there's more than whitespace
-        return bool(text and text.strip())
+        stat = os.stat(pdf_path)
+    except OSError:
+        return True
+    return _has_text_in_pdf_cached(pdf_path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=1024)
+def _has_text_in_pdf_cached(pdf_path, mtime_ns, size):
+    """Probe a PDF for text; mtime_ns and size key the cache to the file version."""
+    try:
+        # Look for text using pdfminer, which parses pages lazily
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+        for page in extract_pages(pdf_path, maxpages=TEXT_PROBE_PAGES):
+            for element in page:
+                if isinstance(element, LTTextContainer) and element.get_text().strip():
+                    return True
+        return False
     except Exception:
         # If we can't determine, assume it has text and let markitdown handle it
         return True
 
 
-def extract_text_from_scanned_pdf(pdf_path, dpi=300, max_pages=None):
+def ocr_image(image):
+    """
+    Run OCR on a single page image.
+    
+    Args:
+        image: PIL image of the page, or path to an image file
+        
+    Returns:
+        str: Recognized text, stripped of surrounding whitespace
+    """
+    if tesserocr is None:
+        return pytesseract.image_to_string(image, config=TESSERACT_CONFIG).strip()
+    
+    api = getattr(_tesseract_local, 'api', None)
+    if api is None:
+        api = _tesseract_local.api = tesserocr.PyTessBaseAPI(oem=tesserocr.OEM.LSTM_ONLY)
+    if isinstance(image, str):
+        api.SetImageFile(image)
+    else:
+        api.SetImage(image)
+    return api.GetUTF8Text().strip()
+
+
+def ocr_all(function, items):
+    """
+    Apply an OCR function to each item, concurrently when there are several.
+    
+    Args:
+        function: Callable taking one item and returning its text
+        items: List of items to OCR
+        
+    Returns:
+        list: Text for each item, in the order of items
+    """
+    if _ocr_slots is not None:
+        function = functools.partial(_ocr_in_slot, function)
+    if OCR_WORKERS > 1 and len(items) > 1:
+        return list(get_ocr_executor().map(function, items))
+    return [function(item) for item in items]
+
+
+def _ocr_in_slot(function, item):
+    """Run an OCR function while holding one of the shared OCR slots."""
+    with _ocr_slots:
+        return function(item)
+
+
+def get_pdf_page_count(pdf_path):
+    """Return the number of pages in a PDF without rendering it."""
+    if fitz is not None:
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+    return pdfinfo_from_path(pdf_path)["Pages"]
+
+
+def ocr_pdf_page(pdf_path, dpi, page_number):
+    """
+    Render one PDF page in memory with PyMuPDF and OCR it.
+    
+    Each call opens its own document handle, since PyMuPDF documents must
+    not be shared between threads.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        dpi: Rendering resolution
+        page_number: 1-based page number
+        
+    Returns:
+        str: Recognized text of the page
+    """
+    zoom = dpi / 72
+    with fitz.open(pdf_path) as doc:
+        pixmap = doc[page_number - 1].get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY)
+    image = Image.frombytes('L', (pixmap.width, pixmap.height), pixmap.samples)
+    return ocr_image(image)
+
+
+def prepare_image_for_ocr(image):
+    """
+    Convert an image to grayscale and scale it down to OCR_DPI if needed.
+    
+    Args:
+        image: PIL image
+        
+    Returns:
+        PIL image ready for Tesseract
+    """
+    image = image.convert('L')
+    dpi = image.info.get('dpi', (0, 0))[0]
+    if dpi > OCR_DPI:
+        scale = OCR_DPI / dpi
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+    return image
+
+
+def get_page_text_layers(pdf_path, max_pages):
+    """
+    Read the embedded text of each page of a PDF.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        max_pages: Number of leading pages to read
+        
+    Returns:
+        list: Stripped text of each page, '' for pages without a text layer.
+        Empty if the PDF cannot be parsed.
+    """
+    try:
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+        return [
+            ''.join(
+                element.get_text() for element in page
+                if isinstance(element, LTTextContainer)
+            ).strip()
+            for page in extract_pages(pdf_path, maxpages=max_pages)
+        ]
+    except Exception:
+        return []
+
+
+def group_page_ranges(page_numbers):
+    """
+    Group ascending page numbers into runs of consecutive pages.
+    
+    Args:
+        page_numbers: Ascending 1-based page numbers
+        
+    Returns:
+        list: [first, last] page number pairs
+    """
+    ranges = []
+    for page_number in page_numbers:
+        if ranges and ranges[-1][1] == page_number - 1:
+            ranges[-1][1] = page_number
+        else:
+            ranges.append([page_number, page_number])
+    return ranges
+
+
+def extract_text_from_scanned_pdf(pdf_path, dpi=OCR_DPI, max_pages=None):
     """
     Extract text from a scanned PDF using OCR.
     
+    Pages that do have a text layer (e.g. typed pages mixed into a scan)
+    use that text and are not rendered or OCR'd.
+    
     Args:
         pdf_path: Path to the scanned PDF file
-        dpi: DPI for image conversion (default: 300)
+        dpi: DPI for image conversion (default: OCR_DPI)
         max_pages: Maximum number of pages to process (default: None for all pages)
         
     Returns:
         str: Extracted text from all pages
     """
     try:
-        # Convert PDF pages to images
-        images = convert_from_path(pdf_path, dpi=dpi)
-        
-        # Limit pages if specified
-        if max_pages and len(images) > max_pages:
-            images = images[:max_pages]
-            pages_info = f"*Processing first {max_pages} of {len(convert_from_path(pdf_path, dpi=dpi))} pages*\n\n"
+        # Read the page count from the PDF metadata and render only the
+        # pages that will be OCR'd
+        total_pages = get_pdf_page_count(pdf_path)
+        if max_pages and total_pages > max_pages:
+            last_page = max_pages
+            pages_info = f"*Processing first {max_pages} of {total_pages} pages*\n\n"
         else:
+            last_page = total_pages
             pages_info = ""
         
-        # Extract text from each page
+        # Use the text layer where a page has one and OCR only the rest
+        texts = get_page_text_layers(pdf_path, last_page)
+        texts += [''] * (last_page - len(texts))
+        ocr_pages = [i + 1 for i, text in enumerate(texts) if not text]
+        
+        if fitz is not None:
+            # Render each page in memory as it is OCR'd, so only the pages
+            # in progress are held at once
+            ocr_texts = ocr_all(functools.partial(ocr_pdf_page, pdf_path, dpi), ocr_pages)
+        else:
+            with tempfile.TemporaryDirectory() as output_folder:
+                # Render the pages to grayscale image files rather than
+                # holding every page in memory at once; Tesseract reads each
+                # file directly. Consecutive pages are rendered in one call.
+                page_paths = []
+                for first_page, last_run_page in group_page_ranges(ocr_pages):
+                    page_paths += convert_from_path(
+                        pdf_path, dpi=dpi, first_page=first_page, last_page=last_run_page,
+                        output_folder=output_folder, fmt='png', paths_only=True,
+                        grayscale=True
+                    )
+                ocr_texts = ocr_all(ocr_image, page_paths)
+        
+        # Fill in the OCR'd pages, keeping page order
+        for page_number, text in zip(ocr_pages, ocr_texts):
+            texts[page_number - 1] = text
+        
         text_parts = []
-        for i, image in enumerate(images):
-            # Perform OCR on the image
-            text = pytesseract.image_to_string(image)
-            if text.strip():
-                text_parts.append(f"## Page {i + 1}\n\n{text.strip()}")
+        for i, text in enumerate(texts):
+            if text:
+                text_parts.append(f"## Page {i + 1}\n\n{text}")
         
         # Combine all pages
         if text_parts:
@@ -103,14 +360,12 @@ def extract_text_from_image(image_path):
         str: Extracted text in markdown format
     """
     try:
-        # Open the image
-        image = Image.open(image_path)
-        
-        # Perform OCR on the image
-        text = pytesseract.image_to_string(image)
+        # Open the image and perform OCR on a grayscale copy
+        with Image.open(image_path) as image:
+            text = ocr_image(prepare_image_for_ocr(image))
         
-        if text.strip():
-            return f"*Text extracted from image using OCR*\n\n{text.strip()}"
+        if text:
+            return f"*Text extracted from image using OCR*\n\n{text}"
         else:
             return "No text could be extracted from the image."
             
@@ -4,6 +4,7 @@ Test script to verify document analysis features work correctly.
 """
 
 import sys
+import traceback
 import tempfile
 import json
 from datetime import datetime
@@ -79,7 +80,68 @@ def test_analysis_utils():
         return True
     except Exception as e:
         print(f"✗ Analysis utils test failed: {e}\n")
-        import traceback
+        traceback.print_exc()
+        return False
+
+
+def check_analysis_result(result, max_keywords=10, max_categories=3):
+    """Assert that an analyze_document() result has the expected shape."""
+    assert set(result) == {'keywords', 'categories', 'severity', 'title', 'statistics'}
+    assert isinstance(result['keywords'], list) and len(result['keywords']) <= max_keywords
+    assert all(isinstance(keyword, str) for keyword in result['keywords'])
+    assert isinstance(result['categories'], list) and 0 < len(result['categories']) <= max_categories
+    assert all({'category', 'confidence', 'matches'} <= set(c) for c in result['categories'])
+    assert {'severity', 'confidence', 'matches'} <= set(result['severity'])
+    assert result['title'] is None or isinstance(result['title'], str)
+    assert isinstance(result['statistics'], dict)
+
+
+def test_analyze_document():
+    """Test the fused analysis pass matches the individual analysis functions."""
+    print("Testing Fused Document Analysis...")
+    try:
+        from analysis_utils import (
+            analyze_document,
+            extract_keywords,
+            predict_categories,
+            predict_severity,
+            predict_title_simple,
+            extract_text_statistics
+        )
+        
+        sample_text = """
+        # Invoice for Software Development
+        
+        Payment due within 30 days. This is an urgent invoice for the
+        technical development of the reporting system and API integration.
+        """
+        
+        result = analyze_document(sample_text)
+        check_analysis_result(result)
+        assert result['keywords'] == extract_keywords(sample_text, max_keywords=10)
+        assert result['categories'] == predict_categories(sample_text, max_categories=3)
+        assert result['severity'] == predict_severity(sample_text)
+        assert result['title'] == predict_title_simple(sample_text)
+        assert result['statistics'] == extract_text_statistics(sample_text)
+        print(f"✓ Fused analysis matches individual functions: {result['title']}")
+        
+        text_lower = sample_text.lower()
+        assert extract_keywords(sample_text, text_lower=text_lower) == result['keywords']
+        assert predict_categories(sample_text, text_lower=text_lower) == result['categories']
+        assert predict_severity(sample_text, text_lower=text_lower) == result['severity']
+        print("✓ Precomputed lowercase text gives the same results")
+        
+        empty = analyze_document("")
+        check_analysis_result(empty)
+        assert empty['keywords'] == []
+        assert empty['categories'][0]['category'] == 'Other'
+        assert empty['severity']['severity'] == 'Normal'
+        print("✓ Fused analysis handles empty text")
+        
+        print("✓ All fused analysis tests passed\n")
+        return True
+    except Exception as e:
+        print(f"✗ Fused analysis test failed: {e}\n")
         traceback.print_exc()
         return False
 
@@ -91,11 +153,8 @@ def test_database_integration():
         from models import init_db, get_session, Conversion
         import json
         
-        # Create temporary database
-        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_db_file:
-            test_db = temp_db_file.name
-        
-        engine = init_db(f'sqlite:///{test_db}')
+        # In-memory database: no file to create or clean up
+        engine = init_db('sqlite:///:memory:')
         session = get_session(engine)
         
         # Create conversion with all new fields
@@ -146,17 +205,241 @@ def test_database_integration():
         assert len(conversion_dict['keywords']) == 4
         print(f"✓ JSON fields parsed correctly")
         
+        # Background jobs start queued and point at their conversion once done
+        from models import ConversionJob, JOB_QUEUED, JOB_FINISHED
+        job = ConversionJob(id='abc123', filename='test_doc.pdf')
+        session.add(job)
+        session.commit()
+        assert job.to_dict()['status'] == JOB_QUEUED
+        job.status = JOB_FINISHED
+        job.conversion_id = saved.id
+        session.commit()
+        assert session.get(ConversionJob, 'abc123').to_dict()['conversion_id'] == saved.id
+        print(f"✓ Conversion jobs track their status")
+        
         # Clean up
         session.close()
+        engine.dispose()
+        
+        print("✓ All database integration tests passed\n")
+        return True
+    except Exception as e:
+        print(f"✗ Database integration test failed: {e}\n")
+        traceback.print_exc()
+        return False
+
+
+def test_conversion_writer():
+    """Test the background writer commits rows submitted concurrently."""
+    print("Testing Background Conversion Writer...")
+    try:
+        from models import init_db, get_session, Conversion
+        from db_utils import ConversionWriter
+        from concurrent.futures import ThreadPoolExecutor
+        import os
+        
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_db_file:
+            test_db = temp_db_file.name
+        
+        engine = init_db(f'sqlite:///{test_db}')
+        writer = ConversionWriter(engine)
+        
+        def submit(i):
+            return writer.submit(
+                filename=f"doc_{i}.txt",
+                original_path=f"/tmp/doc_{i}.txt",
+                markdown_content=f"Document {i}",
+                file_size=i
+            ).result(timeout=10)
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(submit, range(20)))
+        
+        ids = [conversion_id for conversion_id, _ in results]
+        assert len(set(ids)) == 20
+        assert all(isinstance(upload_time, datetime) for _, upload_time in results)
+        print(f"✓ 20 concurrent submissions committed with unique ids")
+        
+        session = get_session(engine)
+        saved = session.get(Conversion, ids[5])
+        assert saved.filename == "doc_5.txt"
+        assert session.query(Conversion).count() == 20
+        print(f"✓ Committed rows are visible to other sessions")
+        
+        failed = writer.submit(filename=None, original_path="/tmp/x", markdown_content="x")
+        assert failed.exception(timeout=10) is not None
+        print(f"✓ Invalid rows fail their own submission")
+        
+        writer.close()
+        session.close()
+        engine.dispose()
+        if os.path.exists(test_db):
+            os.remove(test_db)
+        
+        print("✓ All background writer tests passed\n")
+        return True
+    except Exception as e:
+        print(f"✗ Background writer test failed: {e}\n")
+        traceback.print_exc()
+        return False
+
+
+def test_conversion_job_failure():
+    """Test that a job whose processing raises ends up failed, not running."""
+    print("Testing Conversion Job Failure...")
+    try:
+        import app as app_module
+        from models import ConversionJob, JOB_FAILED
+        
+        def failing_process_upload(*args):
+            raise RuntimeError("converter crashed")
+        
+        job_id = 'failing-job-test'
+        session = app_module.db_session
+        session.add(ConversionJob(id=job_id, filename='broken.pdf'))
+        session.commit()
+        session.remove()
+        
+        original_process_upload = app_module.process_upload
+        app_module.process_upload = failing_process_upload
+        try:
+            app_module.run_conversion_job(job_id, '/tmp/broken.pdf', 'broken.pdf', 0, None, frozenset(), {})
+        finally:
+            app_module.process_upload = original_process_upload
+        
+        try:
+            job = session.get(ConversionJob, job_id)
+            assert job.status == JOB_FAILED, job.status
+            assert job.error == "converter crashed"
+            assert job.finished_at is not None
+            print(f"✓ Job is marked failed when processing raises")
+        finally:
+            session.query(ConversionJob).filter_by(id=job_id).delete()
+            session.commit()
+            session.remove()
+        
+        print("✓ All conversion job failure tests passed\n")
+        return True
+    except Exception as e:
+        print(f"✗ Conversion job failure test failed: {e}\n")
+        traceback.print_exc()
+        return False
+
+
+def test_config_cache():
+    """Test the in-process settings cache reads and writes through."""
+    print("Testing Config Cache...")
+    try:
+        from models import init_db, get_session, init_default_config, AppConfig
+        from db_utils import ConfigCache
         import os
+        
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_db_file:
+            test_db = temp_db_file.name
+        
+        engine = init_db(f'sqlite:///{test_db}')
+        session = get_session(engine)
+        init_default_config(session)
+        
+        cache = ConfigCache(engine)
+        assert cache.get('processing_timeout') == '300'
+        assert cache.get('missing_key', 'default') == 'default'
+        print("✓ Settings loaded from the database")
+        
+        assert cache.set('processing_timeout', '120')
+        assert cache.get('processing_timeout') == '120'
+        session.expire_all()
+        saved = session.query(AppConfig).filter_by(key='processing_timeout').first()
+        assert saved.value == '120'
+        print("✓ set() writes through to the database")
+        
+        assert '.pdf' in cache.allowed_extensions
+        assert cache.set('allowed_extensions', '.TXT, md, .tar.gz,')
+        assert cache.allowed_extensions == ('.md', '.tar.gz', '.txt')
+        assert 'backup.TAR.GZ'.lower().endswith(cache.allowed_extensions)
+        print("✓ Allowed extensions are parsed when the setting changes")
+        
+        updated = cache.set_many({'max_ocr_pages': '10', 'llm_task': 'correct_only', 'missing_key': 'x'})
+        assert updated == {'max_ocr_pages', 'llm_task'}
+        assert cache.get('max_ocr_pages') == '10'
+        print("✓ set_many() updates several settings at once")
+        
+        snapshot = cache.snapshot()
+        cache.set('max_ocr_pages', '20')
+        assert snapshot['max_ocr_pages'] == '10'
+        assert cache.snapshot()['max_ocr_pages'] == '20'
+        print("✓ Snapshots are unaffected by later updates")
+        
+        assert not cache.set('missing_key', 'value')
+        assert cache.get('missing_key') is None
+        print("✓ Unknown settings are not created")
+        
+        # Changes made elsewhere are picked up once the TTL expires
+        saved.value = '90'
+        session.commit()
+        assert cache.get('processing_timeout') == '120'
+        expired = ConfigCache(engine, ttl=0)
+        assert expired.get('processing_timeout') == '90'
+        print("✓ Stale settings are re-read after the TTL")
+        
+        session.close()
+        engine.dispose()
         if os.path.exists(test_db):
             os.remove(test_db)
         
-        print("✓ All database integration tests passed\n")
+        print("✓ All config cache tests passed\n")
         return True
     except Exception as e:
-        print(f"✗ Database integration test failed: {e}\n")
-        import traceback
+        print(f"✗ Config cache test failed: {e}\n")
+        traceback.print_exc()
+        return False
+
+
+def test_ocr_concurrency():
+    """Test that page OCR fans out over threads, within the shared slots."""
+    print("Testing OCR Page Concurrency...")
+    try:
+        import ocr_utils
+        import threading
+        import time
+        
+        lock = threading.Lock()
+        active = [0]
+        peak = [0]
+        
+        def fake_ocr(page):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return f"page {page}"
+        
+        original_workers = ocr_utils.OCR_WORKERS
+        ocr_utils.OCR_WORKERS = 4
+        ocr_utils._ocr_executor = None
+        try:
+            texts = ocr_utils.ocr_all(fake_ocr, list(range(8)))
+            assert texts == [f"page {i}" for i in range(8)]
+            assert peak[0] > 1, peak[0]
+            print(f"✓ ocr_all() OCRs {peak[0]} pages at once with OCR_WORKERS=4")
+            
+            peak[0] = 0
+            ocr_utils.set_ocr_slots(threading.BoundedSemaphore(2))
+            texts = ocr_utils.ocr_all(fake_ocr, list(range(8)))
+            assert texts == [f"page {i}" for i in range(8)]
+            assert peak[0] == 2, peak[0]
+            print(f"✓ Shared OCR slots bound the pages OCR'd at once")
+        finally:
+            ocr_utils.set_ocr_slots(None)
+            ocr_utils.OCR_WORKERS = original_workers
+            ocr_utils._ocr_executor = None
+        
+        print("✓ All OCR concurrency tests passed\n")
+        return True
+    except Exception as e:
+        print(f"✗ OCR concurrency test failed: {e}\n")
         traceback.print_exc()
         return False
 
@@ -211,7 +494,6 @@ def test_feature_combinations():
         return True
     except Exception as e:
         print(f"✗ Feature combination test failed: {e}\n")
-        import traceback
         traceback.print_exc()
         return False
 
@@ -255,7 +537,6 @@ def test_edge_cases():
         return True
     except Exception as e:
         print(f"✗ Edge case test failed: {e}\n")
-        import traceback
         traceback.print_exc()
         return False
 
@@ -269,7 +550,12 @@ def main():
     
     tests = [
         ("Analysis Utilities", test_analysis_utils),
+        ("Fused Document Analysis", test_analyze_document),
         ("Database Integration", test_database_integration),
+        ("Background Conversion Writer", test_conversion_writer),
+        ("Conversion Job Failure", test_conversion_job_failure),
+        ("Config Cache", test_config_cache),
+        ("OCR Page Concurrency", test_ocr_concurrency),
         ("Feature Combinations", test_feature_combinations),
         ("Edge Cases", test_edge_cases),
     ]
@@ -281,7 +567,6 @@ def main():
             results.append((test_name, result))
         except Exception as e:
             print(f"✗ {test_name} crashed: {e}\n")
-            import traceback
             traceback.print_exc()
             results.append((test_name, False))
     
@@ -4,9 +4,8 @@ Test script to verify the LLM integration works correctly.
 This script tests the entire workflow without requiring the actual model file.
 """
 
-import os
 import sys
-import tempfile
+import traceback
 from datetime import datetime
 
 def test_imports():
@@ -54,6 +53,102 @@ def test_llm_utils():
         assert result is None  # No model loaded, should return None
         print(f"✓ process_document() handles missing model gracefully")
         
+        # Test that generations on the shared model never overlap
+        import threading
+        import time
+        active = []
+        overlaps = []
+        
+        def fake_model(prompt, **kwargs):
+            active.append(prompt)
+            if len(active) > 1:
+                overlaps.append(prompt)
+            time.sleep(0.01)
+            active.remove(prompt)
+            return {'choices': [{'text': 'ok'}]}
+        
+        llm_utils._llm_model = fake_model
+        try:
+            threads = [
+                threading.Thread(target=llm_utils.process_document, args=(f"Doc {i}",))
+                for i in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            llm_utils._llm_model = None
+        assert not overlaps
+        print(f"✓ Concurrent requests take turns on the model")
+        
+        # Test combined processing parses the JSON reply
+        def fake_json_model(prompt, **kwargs):
+            assert '"title"' in prompt and '"corrected"' in prompt
+            return {'choices': [{'text': 'Here you go: {"title": "\\"Laporan\\"", "summary": "Ringkasan", "corrected": ""}'}]}
+        
+        llm_utils._llm_model = fake_json_model
+        try:
+            combined = llm_utils.process_document_combined("Isi dokumen", want=['title', 'summary', 'corrected'])
+        finally:
+            llm_utils._llm_model = None
+        assert combined == {'title': 'Laporan', 'summary': 'Ringkasan'}
+        print(f"✓ process_document_combined() parses the JSON reply")
+        
+        # Test a reply cut off at the token limit keeps its finished fields
+        def truncated_json_model(prompt, **kwargs):
+            return {'choices': [{'text': '{"title": "Laporan", "summary": "Ringkasan", "corrected": "Isi dok'}]}
+        
+        llm_utils._llm_model = truncated_json_model
+        try:
+            combined = llm_utils.process_document_combined("Isi dokumen lain", want=['corrected', 'summary', 'title'])
+        finally:
+            llm_utils._llm_model = None
+        assert combined == {'title': 'Laporan', 'summary': 'Ringkasan'}
+        print(f"✓ process_document_combined() keeps fields finished before truncation")
+        
+        # Test repeated documents are served from the output cache
+        calls = []
+        
+        def counting_model(prompt, **kwargs):
+            calls.append(prompt)
+            return {'choices': [{'text': 'Cached title'}]}
+        
+        llm_utils._llm_model = counting_model
+        try:
+            first = llm_utils.generate_title("Same document")
+            second = llm_utils.generate_title("Same document")
+            llm_utils.generate_title("Same document", temperature=0.9)
+        finally:
+            llm_utils._llm_model = None
+            llm_utils.clear_llm_cache()
+        assert first == second == 'Cached title'
+        assert len(calls) == 2
+        print(f"✓ Repeated LLM requests are served from the cache")
+        
+        # Test concurrent first requests load the model only once
+        loads = []
+        original_initialize = llm_utils.initialize_llm
+        
+        def slow_initialize(*args, **kwargs):
+            loads.append(1)
+            time.sleep(0.05)
+            llm_utils._llm_model = counting_model
+            return True
+        
+        llm_utils.initialize_llm = slow_initialize
+        try:
+            threads = [threading.Thread(target=llm_utils.ensure_llm_loaded) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            llm_utils.initialize_llm = original_initialize
+            llm_utils._llm_model = None
+        assert len(loads) == 1
+        print(f"✓ Concurrent first requests share one model load")
+        
         print("✓ All LLM utility tests passed\n")
         return True
     except Exception as e:
@@ -67,11 +162,8 @@ def test_database_model():
     try:
         from models import init_db, get_session, init_default_config, Conversion, AppConfig
         
-        # Create temporary database
-        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_db_file:
-            test_db = temp_db_file.name
-        
-        engine = init_db(f'sqlite:///{test_db}')
+        # In-memory database: no file to create or clean up
+        engine = init_db('sqlite:///:memory:')
         session = get_session(engine)
         
         # Initialize config
@@ -113,14 +205,12 @@ def test_database_model():
         
         # Clean up
         session.close()
-        if os.path.exists(test_db):
-            os.remove(test_db)
+        engine.dispose()
         
         print("✓ All database model tests passed\n")
         return True
     except Exception as e:
         print(f"✗ Database model test failed: {e}\n")
-        import traceback
         traceback.print_exc()
         return False
 
@@ -129,21 +219,12 @@ def test_app_integration():
     """Test Flask app configuration."""
     print("Testing Flask app integration...")
     try:
-        from app import app
-        from models import init_db, get_session, init_default_config, AppConfig
-        
-        # Create test database
-        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_db_file:
-            test_db = temp_db_file.name
-        
-        engine = init_db(f'sqlite:///{test_db}')
-        session = get_session(engine)
-        init_default_config(session)
+        import app as app_module
+        app = app_module.app
         
         # Test that app has LLM-related imports
-        import app as app_module
         assert hasattr(app_module, 'process_document')
-        assert hasattr(app_module, 'initialize_llm')
+        assert hasattr(app_module, 'generate_title')
         assert hasattr(app_module, 'get_model_info')
         print("✓ App has LLM imports")
         
@@ -151,16 +232,10 @@ def test_app_integration():
         assert app is not None
         print("✓ Flask app instance created")
         
-        # Clean up
-        session.close()
-        if os.path.exists(test_db):
-            os.remove(test_db)
-        
         print("✓ All app integration tests passed\n")
         return True
     except Exception as e:
         print(f"✗ App integration test failed: {e}\n")
-        import traceback
         traceback.print_exc()
         return False
 
@@ -224,7 +299,6 @@ def main():
             results.append((test_name, result))
         except Exception as e:
             print(f"✗ {test_name} crashed: {e}\n")
-            import traceback
             traceback.print_exc()
             results.append((test_name, False))
     